@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from file_compression import FileCompress
+
+
+WORDS = ['price', 'volume', 'open', 'close', 'high', 'low', 'market', 'order', 'trade', 'quote', '<div>', '</div>',
+         '<span class="value">', '</span>', '2026-01-01', 'null', 'true', 'false']
+
+
+def generate_corpus(corpus_folder, no_files, file_size, seed=0):
+    random_generator = random.Random(seed)
+    full_file_list = []
+    for index in range(no_files):
+        full_path = os.path.join(corpus_folder, 'file_{}.html'.format(index))
+        words = []
+        size = 0
+        while size < file_size:
+            word = random_generator.choice(WORDS) if random_generator.random() < 0.8 else str(
+                random_generator.random())
+            words.append(word)
+            size += len(word) + 1
+        with open(full_path, 'w', encoding='utf-8') as file:
+            file.write(' '.join(words))
+        full_file_list.append(full_path)
+    return full_file_list
+
+
+def benchmark_codec(file_compress, full_file_list, root_folder, compression_format, compression_level, parallel):
+    compressed_file_name = 'benchmark.tar.{}'.format(compression_format)
+    raw_bytes = sum(os.path.getsize(full_path) for full_path in full_file_list)
+    start_time = time.perf_counter()
+    file_compress.compress_list_of_files(full_file_list, root_folder, compressed_file_name, compression_level,
+                                         parallel)
+    compress_time = time.perf_counter() - start_time
+    compressed_bytes = os.path.getsize(os.path.join(root_folder, compressed_file_name))
+    extract_folder = tempfile.mkdtemp(dir=root_folder)
+    shutil.move(os.path.join(root_folder, compressed_file_name), extract_folder)
+    start_time = time.perf_counter()
+    file_compress.extract_compressed_file(compressed_file_name, extract_folder)
+    extract_time = time.perf_counter() - start_time
+    shutil.rmtree(extract_folder)
+    return {'format': compression_format, 'level': file_compress.get_compression_level(
+        compression_format, compression_level), 'parallel': parallel, 'raw_bytes': raw_bytes,
+        'compressed_bytes': compressed_bytes, 'ratio': raw_bytes / compressed_bytes,
+        'compress_seconds': compress_time, 'compress_mb_per_second': raw_bytes / compress_time / 2 ** 20,
+        'extract_seconds': extract_time, 'extract_mb_per_second': raw_bytes / extract_time / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FileCompress codecs on a synthetic corpus.')
+    parser.add_argument('--no-files', type=int, default=200)
+    parser.add_argument('--file-size', type=int, default=256 * 2 ** 10)
+    parser.add_argument('--formats', nargs='+', default=['gz', 'bz2', 'xz', 'zst', 'lz4'])
+    parser.add_argument('--level', type=int, default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    file_compress = FileCompress('benchmark', logging.getLogger('benchmark_compression'))
+    root_folder = tempfile.mkdtemp()
+    try:
+        full_file_list = generate_corpus(root_folder, args.no_files, args.file_size)
+        baseline = benchmark_codec(file_compress, full_file_list, root_folder, 'gz', None, False)
+        baseline['baseline'] = True
+        results = [baseline]
+        for compression_format in args.formats:
+            for parallel in [False, True]:
+                result = benchmark_codec(file_compress, full_file_list, root_folder, compression_format, args.level,
+                                         parallel)
+                result['baseline'] = False
+                result['compress_speedup'] = baseline['compress_seconds'] / result['compress_seconds']
+                result['ratio_vs_baseline'] = result['ratio'] / baseline['ratio']
+                results.append(result)
+    finally:
+        shutil.rmtree(root_folder)
+    output = '\n'.join(json.dumps(result) for result in results)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ['pandas', 'pyarrow', 'joblib', 'redis', 's3fs', 'numpy']
+
+
+def run_import_time(module):
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)], cwd=ROOT_FOLDER,
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError('Error in importing {}. {}'.format(module, result.stderr.strip().splitlines()[-1]))
+    imports = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        imports.append({'name': name.strip(), 'level': (len(name) - len(name.lstrip()) - 1) // 2,
+                        'self_us': int(self_time), 'cumulative_us': int(cumulative_time)})
+    return imports
+
+
+def benchmark_module(module, repeat, forbidden_modules):
+    runs = [run_import_time(module) for _ in range(repeat)]
+    totals = [sum(item['cumulative_us'] for item in imports if item['level'] == 0) for imports in runs]
+    imports = runs[totals.index(min(totals))]
+    imported_modules = set(item['name'] for item in imports)
+    heaviest = sorted(imports, key=lambda item: item['self_us'], reverse=True)[:10]
+    return {'module': module, 'import_ms': min(totals) / 1000, 'no_modules': len(imported_modules),
+            'forbidden_imported': sorted(name for name in forbidden_modules if name in imported_modules),
+            'heaviest': [{'name': item['name'], 'self_ms': item['self_us'] / 1000} for item in heaviest]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the import time of sctys_io modules with -X importtime.')
+    parser.add_argument('--modules', nargs='+', default=['file_io', 's3_file_io', 'mongodb_io', 'file_compression'])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--forbid', nargs='*', default=HEAVY_MODULES)
+    parser.add_argument('--max-ms', type=float, default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    results = [benchmark_module(module, args.repeat, args.forbid) for module in args.modules]
+    output = '\n'.join(json.dumps(result) for result in results)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+    failed = [result['module'] for result in results if len(result['forbidden_imported']) > 0 or (
+        args.max_ms is not None and result['import_ms'] > args.max_ms)]
+    if len(failed) > 0:
+        print('Import time check failed for {}'.format(', '.join(failed)), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import statistics
+import subprocess
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmark_compression import WORDS, generate_corpus, benchmark_codec
+
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FILE_TYPES = ['txt', 'html', 'json', 'binary', 'joblib', 'pickle', 'csv', 'parquet', 'arrow', 'feather', 'excel']
+FILE_EXTENSIONS = {'joblib': 'joblib', 'pickle': 'pkl', 'excel': 'xlsx', 'binary': 'bin'}
+SAVE_KWARGS = {'csv': {'index': False}, 'excel': {'index': False}}
+LOAD_KWARGS = {'arrow': {'pandas': True}, 'feather': {'pandas': True}}
+RESULT_KEYS = ['suite', 'backend', 'file_type', 'mode', 'format', 'parallel', 'operation']
+
+
+def generate_dataframe(no_rows, no_columns=8, seed=0):
+    import numpy as np
+    import pandas as pd
+    random_generator = np.random.default_rng(seed)
+    data = {}
+    for index in range(no_columns):
+        column_type = index % 4
+        if column_type == 0:
+            data['float_{}'.format(index)] = random_generator.random(no_rows)
+        elif column_type == 1:
+            data['int_{}'.format(index)] = random_generator.integers(0, 10 ** 6, no_rows)
+        elif column_type == 2:
+            data['str_{}'.format(index)] = random_generator.choice(
+                ['AAPL', 'MSFT', 'GOOG', 'AMZN', 'TSLA', 'NVDA', 'META', 'NFLX'], no_rows)
+        else:
+            data['time_{}'.format(index)] = pd.Timestamp('2026-01-01') + pd.to_timedelta(
+                random_generator.integers(0, 86400 * 365, no_rows), unit='s')
+    return pd.DataFrame(data)
+
+
+def generate_text(text_size, seed=0):
+    random_generator = random.Random(seed)
+    words = []
+    size = 0
+    while size < text_size:
+        word = random_generator.choice(WORDS) if random_generator.random() < 0.8 else str(random_generator.random())
+        words.append(word)
+        size += len(word) + 1
+    return ' '.join(words)
+
+
+def generate_file_data(file_type, data_frame, text):
+    if file_type in ['txt', 'html']:
+        return text
+    if file_type == 'binary':
+        return text.encode('utf-8')
+    if file_type == 'json':
+        return {column: data_frame[column].astype(str).tolist() for column in data_frame.columns}
+    return data_frame
+
+
+def get_file_name(file_type, index=0):
+    return 'benchmark_{}.{}'.format(index, FILE_EXTENSIONS.get(file_type, file_type))
+
+
+def summarise_times(times):
+    return {'min': min(times), 'median': statistics.median(times), 'max': max(times)}
+
+
+def get_io_phase_summary(io_metrics, operation):
+    summary = {'serialise_seconds': 0, 'io_seconds': 0, 'bytes': 0}
+    for series in io_metrics.to_dict():
+        if series['component'] == 'file_io' and series['operation'] == operation:
+            summary['serialise_seconds'] += series['seconds']['serialise']['sum']
+            summary['io_seconds'] += series['seconds']['io']['sum']
+            summary['bytes'] += series['bytes']['sum']
+    return summary
+
+
+def benchmark_file_type(file_io, io_metrics, file_type, data, file_path, repeat, loop=None):
+    file_name = get_file_name(file_type)
+    save_kwargs = SAVE_KWARGS.get(file_type, {})
+    load_kwargs = LOAD_KWARGS.get(file_type, {})
+    mode = 'sync' if loop is None else 'async'
+    results = []
+    for operation in ['save', 'load']:
+        if loop is not None:
+            if operation == 'save':
+                func = lambda: loop.run_until_complete(file_io.async_save_file(data, file_path, file_name, file_type,
+                                                                               **save_kwargs))
+            else:
+                func = lambda: loop.run_until_complete(file_io.async_load_file(file_path, file_name, file_type,
+                                                                               **load_kwargs)) is not None
+        elif operation == 'save':
+            func = lambda: file_io.save_file(data, file_path, file_name, file_type, **save_kwargs)
+        else:
+            func = lambda: file_io.load_file(file_path, file_name, file_type, **load_kwargs) is not None
+        times = []
+        phases = []
+        for _ in range(repeat):
+            io_metrics.reset()
+            start_time = time.perf_counter()
+            success = func()
+            times.append(time.perf_counter() - start_time)
+            if not success:
+                raise RuntimeError('Error in {} {} file'.format(operation, file_type))
+            phases.append(get_io_phase_summary(io_metrics, operation))
+        file_bytes = phases[-1]['bytes']
+        median_time = statistics.median(times)
+        results.append({'suite': 'file_io', 'backend': file_io.backend.NAME, 'file_type': file_type, 'mode': mode,
+                        'operation': operation, 'repeat': repeat, 'bytes': file_bytes,
+                        'seconds': summarise_times(times),
+                        'serialise_seconds': statistics.median(phase['serialise_seconds'] for phase in phases),
+                        'io_seconds': statistics.median(phase['io_seconds'] for phase in phases),
+                        'mb_per_second': file_bytes / median_time / 2 ** 20 if median_time > 0 else 0})
+    return results
+
+
+def benchmark_file_io(file_io, io_metrics, file_path, file_types, data_frame, text, repeat, mode='sync'):
+    loop = asyncio.new_event_loop() if mode == 'async' else None
+    results = []
+    try:
+        for file_type in file_types:
+            data = generate_file_data(file_type, data_frame, text)
+            try:
+                results.extend(benchmark_file_type(file_io, io_metrics, file_type, data, file_path, repeat, loop))
+            except Exception as e:
+                results.append({'suite': 'file_io', 'backend': file_io.backend.NAME, 'file_type': file_type,
+                                'mode': mode, 'error': str(e)})
+            file_io.clear_fail_save_list()
+            file_io.clear_fail_load_list()
+    finally:
+        if loop is not None:
+            if hasattr(file_io, 'close_async_s3'):
+                loop.run_until_complete(file_io.close_async_s3())
+            loop.close()
+    return results
+
+
+def benchmark_s3_transfer(s3_file_io, local_path, remote_path, no_files, file_size):
+    full_file_list = generate_corpus(local_path, no_files, file_size)
+    file_list = [os.path.basename(full_path) for full_path in full_file_list]
+    results = []
+    upload_report = s3_file_io.upload_list_of_files_to_s3_folder(local_path, remote_path, file_list)
+    download_path = os.path.join(local_path, 'download')
+    download_report = s3_file_io.download_list_of_files_from_s3_folder(remote_path, download_path, file_list)
+    for report in [upload_report, download_report]:
+        results.append({'suite': 's3_transfer', 'backend': 's3', 'operation': report['operation'],
+                        'files': report['files'], 'bytes': report['bytes'], 'failed_files': len(report['failed_files']),
+                        'seconds': report['seconds'], 'files_per_second': report['files_per_second'],
+                        'mb_per_second': report['bytes_per_second'] / 2 ** 20})
+    shutil.rmtree(download_path)
+    s3_file_io.remove_all_files_in_s3_folder(remote_path)
+    return results
+
+
+def benchmark_file_compress(file_compress, root_folder, compression_formats, no_files, file_size):
+    corpus_folder = tempfile.mkdtemp(dir=root_folder)
+    full_file_list = generate_corpus(corpus_folder, no_files, file_size)
+    results = []
+    for compression_format in compression_formats:
+        for parallel in [False, True]:
+            try:
+                result = benchmark_codec(file_compress, full_file_list, corpus_folder, compression_format, None,
+                                         parallel)
+            except ImportError as e:
+                result = {'format': compression_format, 'parallel': parallel, 'error': str(e)}
+            results.append({'suite': 'file_compress', 'backend': 'local', **result})
+    shutil.rmtree(corpus_folder)
+    return results
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT_FOLDER, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def get_environment(args):
+    import pandas as pd
+    import pyarrow
+    return {'suite': 'environment', 'commit': get_git_commit(), 'timestamp': time.time(),
+            'python': platform.python_version(), 'platform': platform.platform(), 'cpu_count': os.cpu_count(),
+            'pandas': pd.__version__, 'pyarrow': pyarrow.__version__, 'args': vars(args)}
+
+
+def get_result_key(result):
+    return tuple(result.get(key) for key in RESULT_KEYS)
+
+
+def get_result_seconds(result):
+    seconds = result.get('seconds')
+    if isinstance(seconds, dict):
+        return seconds['median']
+    return result.get('compress_seconds', seconds)
+
+
+def compare_results(results, baseline_file):
+    with open(baseline_file, 'r', encoding='utf-8') as file:
+        baseline = {get_result_key(result): result for result in map(json.loads, file)
+                    if result['suite'] != 'environment' and 'error' not in result}
+    comparisons = []
+    for result in results:
+        baseline_result = baseline.get(get_result_key(result))
+        if result['suite'] == 'environment' or 'error' in result or baseline_result is None:
+            continue
+        seconds = get_result_seconds(result)
+        baseline_seconds = get_result_seconds(baseline_result)
+        comparisons.append({**{key: result.get(key) for key in RESULT_KEYS}, 'suite': 'comparison',
+                            'compared_suite': result['suite'], 'seconds': seconds,
+                            'baseline_seconds': baseline_seconds, 'ratio': seconds / baseline_seconds})
+    return comparisons
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark FileIO formats, S3FileIO transfers and FileCompress '
+                                                 'codecs on synthetic data.')
+    parser.add_argument('--suites', nargs='+', default=['file_io', 'file_compress'],
+                        choices=['file_io', 's3', 'file_compress'])
+    parser.add_argument('--file-types', nargs='+', default=FILE_TYPES)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=8)
+    parser.add_argument('--text-size', type=int, default=4 * 2 ** 20)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--s3-path', default=None)
+    parser.add_argument('--s3-endpoint-url', default=None)
+    parser.add_argument('--no-files', type=int, default=50)
+    parser.add_argument('--file-size', type=int, default=256 * 2 ** 10)
+    parser.add_argument('--formats', nargs='+', default=['gz', 'bz2', 'xz', 'zst', 'lz4'])
+    parser.add_argument('--compare', default=None)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+    if args.s3_endpoint_url is not None:
+        os.environ['AWS_ENDPOINT_URL'] = args.s3_endpoint_url
+    if 's3' in args.suites and args.s3_path is None:
+        parser.error('--s3-path is required for the s3 suite')
+    from file_io import FileIO
+    from io_metrics import io_metrics
+    logger = logging.getLogger('benchmark_io')
+    FileIO.set_io_metrics(True)
+    results = [get_environment(args)]
+    root_folder = tempfile.mkdtemp()
+    try:
+        if 'file_io' in args.suites or 's3' in args.suites:
+            data_frame = generate_dataframe(args.rows, args.columns, args.seed)
+            text = generate_text(args.text_size, args.seed)
+        if 'file_io' in args.suites:
+            file_io = FileIO('benchmark', logger)
+            results.extend(benchmark_file_io(file_io, io_metrics, root_folder, args.file_types, data_frame, text,
+                                             args.repeat))
+        if 's3' in args.suites:
+            from s3_file_io import S3FileIO
+            s3_file_io = S3FileIO('benchmark', logger)
+            remote_path = '{}/benchmark_io'.format(args.s3_path.rstrip('/'))
+            s3_file_io.create_directory_if_not_exist(remote_path)
+            results.extend(benchmark_file_io(s3_file_io, io_metrics, remote_path, args.file_types, data_frame, text,
+                                             args.repeat))
+            results.extend(benchmark_file_io(s3_file_io, io_metrics, remote_path, args.file_types, data_frame, text,
+                                             args.repeat, 'async'))
+            transfer_folder = tempfile.mkdtemp(dir=root_folder)
+            results.extend(benchmark_s3_transfer(s3_file_io, transfer_folder, remote_path + '_transfer',
+                                                 args.no_files, args.file_size))
+            s3_file_io.remove_all_files_in_s3_folder(remote_path)
+        if 'file_compress' in args.suites:
+            from file_compression import FileCompress
+            file_compress = FileCompress('benchmark', logger)
+            results.extend(benchmark_file_compress(file_compress, root_folder, args.formats, args.no_files,
+                                                   args.file_size))
+    finally:
+        shutil.rmtree(root_folder)
+    if args.compare is not None:
+        results.extend(compare_results(results, args.compare))
+    output = '\n'.join(json.dumps(result, default=str) for result in results)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -4,17 +4,168 @@ sys.path.append(os.environ['SCTYS_PROJECT'] + '/sctys_global_parameters')
 from global_parameters import Path
 sys.path.append(Path.NOTIFIER_PROJECT)
 sys.path.append(Path.UTILITIES_PROJECT)
-from notifiers import get_notifier
-from utilities_functions import convert_datetime_to_timestamp
 import tarfile
-import tqdm
+import io
+import json
+import gzip
+import bz2
+import lzma
+import functools
+import queue
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io_metrics import io_metrics
+from storage_backend import is_atomic_temp_file
+
+
+class ParallelBlockWriter(object):
+
+    def __init__(self, file, compress_func, block_size, executor, max_in_flight):
+        self.file = file
+        self.compress_func = compress_func
+        self.block_size = block_size
+        self.executor = executor
+        self.max_in_flight = max_in_flight
+        self.buffer = bytearray()
+        self.in_flight = deque()
+        self.blocks = []
+        self.compressed_offset = 0
+
+    def _write_next_block(self):
+        compressed_block = self.in_flight.popleft().result()
+        self.file.write(compressed_block)
+        self.blocks.append([self.compressed_offset, len(compressed_block)])
+        self.compressed_offset += len(compressed_block)
+
+    def _submit_block(self, block):
+        self.in_flight.append(self.executor.submit(self.compress_func, block))
+        while len(self.in_flight) >= self.max_in_flight:
+            self._write_next_block()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.block_size:
+            self._submit_block(bytes(self.buffer[:self.block_size]))
+            del self.buffer[:self.block_size]
+        return len(data)
+
+    def close(self):
+        if len(self.buffer) > 0:
+            self._submit_block(bytes(self.buffer))
+            self.buffer = bytearray()
+        while len(self.in_flight) > 0:
+            self._write_next_block()
+
+    def flush(self):
+        pass
+
+
+class BackgroundStreamWriter(object):
+
+    def __init__(self, file, max_queue_size):
+        self.file = file
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            data = self.queue.get()
+            if data is None:
+                return
+            if self.error is None:
+                try:
+                    self.file.write(data)
+                except Exception as e:
+                    self.error = e
+
+    def write(self, data):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        if self.error is not None:
+            raise self.error
+
+
+class BackgroundStreamReader(object):
+
+    def __init__(self, file, chunk_size, max_queue_size):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.stop_event = threading.Event()
+        self.buffer = bytearray()
+        self.eof = False
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _put(self, data):
+        while not self.stop_event.is_set():
+            try:
+                self.queue.put(data, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _run(self):
+        try:
+            while not self.stop_event.is_set():
+                data = self.file.read(self.chunk_size)
+                if not data:
+                    break
+                self._put(data)
+        except Exception as e:
+            self.error = e
+        self._put(None)
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            data = self.queue.get()
+            if data is None:
+                self.eof = True
+                if self.error is not None:
+                    raise self.error
+            else:
+                self.buffer += data
+        if size is None or size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
 
 
 class FileCompress(object):
 
+    TARFILE_FORMATS = ['gz', 'bz2', 'xz']
+    DEFAULT_COMPRESSION_LEVEL = {'gz': 9, 'bz2': 9, 'xz': 6, 'zst': 3, 'lz4': 0}
+    COMPRESSION_THREADS = os.cpu_count()
+    PARALLEL_BLOCK_SIZE = 16 * 2 ** 20
+    INDEXED_BLOCK_SIZE = 4 * 2 ** 20
+    INDEX_SUFFIX = '.idx.json'
+    STREAM_QUEUE_SIZE = 16
+    STREAM_READ_SIZE = 8 * 2 ** 20
+
     def __init__(self, project, logger):
         self.project = project
         self.logger = logger
+        self.archive_indexes = {}
 
     @ staticmethod
     def set_compression_format(compression_format):
@@ -24,6 +175,183 @@ class FileCompress(object):
     def get_compression_format_from_file_name(compressed_file_name):
         return compressed_file_name.split('.')[-1]
 
+    def get_compression_level(self, compression_format, compression_level=None):
+        if compression_level is None:
+            compression_level = self.DEFAULT_COMPRESSION_LEVEL.get(compression_format)
+        return compression_level
+
+    @ staticmethod
+    def _compress_block_gz(data, compression_level):
+        return gzip.compress(data, compresslevel=compression_level)
+
+    @ staticmethod
+    def _compress_block_bz2(data, compression_level):
+        return bz2.compress(data, compression_level)
+
+    @ staticmethod
+    def _compress_block_xz(data, compression_level):
+        return lzma.compress(data, preset=compression_level)
+
+    @ staticmethod
+    def _compress_block_zst(data, compression_level):
+        import zstandard
+        return zstandard.ZstdCompressor(level=compression_level).compress(data)
+
+    @ staticmethod
+    def _compress_block_lz4(data, compression_level):
+        import lz4.frame
+        return lz4.frame.compress(data, compression_level=compression_level)
+
+    @ staticmethod
+    def _decompress_block_gz(data):
+        return gzip.decompress(data)
+
+    @ staticmethod
+    def _decompress_block_bz2(data):
+        return bz2.decompress(data)
+
+    @ staticmethod
+    def _decompress_block_xz(data):
+        return lzma.decompress(data)
+
+    @ staticmethod
+    def _decompress_block_zst(data):
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+
+    @ staticmethod
+    def _decompress_block_lz4(data):
+        import lz4.frame
+        return lz4.frame.decompress(data)
+
+    @ staticmethod
+    def _add_to_tar(t, full_path, arcname, member_spans=None):
+        start_offset = t.offset
+        no_members = len(t.members)
+        t.add(full_path, arcname)
+        if member_spans is not None:
+            for member in t.members[no_members:]:
+                member_spans[member.name] = [start_offset, t.offset]
+
+    def get_index_file_path(self, tar_file_path):
+        return tar_file_path + self.INDEX_SUFFIX
+
+    @ staticmethod
+    def _get_archive_stamp(tar_file_path):
+        file_stat = os.stat(tar_file_path)
+        return [file_stat.st_size, file_stat.st_mtime_ns]
+
+    def _save_archive_index(self, tar_file_path, index):
+        index_file_path = self.get_index_file_path(tar_file_path)
+        index['archive'] = self._get_archive_stamp(tar_file_path)
+        with open(index_file_path + '.tmp', 'w', encoding='utf-8') as file:
+            json.dump(index, file)
+        os.replace(index_file_path + '.tmp', index_file_path)
+
+    def remove_archive_index(self, tar_file_path):
+        index_file_path = self.get_index_file_path(tar_file_path)
+        if os.path.isfile(index_file_path):
+            os.remove(index_file_path)
+        self.archive_indexes.pop(tar_file_path, None)
+
+    def load_archive_index(self, tar_file_path):
+        index_file_path = self.get_index_file_path(tar_file_path)
+        if not os.path.isfile(index_file_path) or not os.path.isfile(tar_file_path):
+            return None
+        modified_time = (os.path.getmtime(tar_file_path), os.path.getmtime(index_file_path))
+        if tar_file_path not in self.archive_indexes or self.archive_indexes[tar_file_path][0] != modified_time:
+            with open(index_file_path, 'r', encoding='utf-8') as file:
+                self.archive_indexes[tar_file_path] = (modified_time, json.load(file))
+        index = self.archive_indexes[tar_file_path][1]
+        if index.get('archive') != self._get_archive_stamp(tar_file_path):
+            self.logger.info('Index of {} does not match the archive. Ignore the index.'.format(tar_file_path))
+            return None
+        return index
+
+    def _open_compressed_writer(self, file, compression_format, compression_level):
+        if compression_format == 'gz':
+            return gzip.GzipFile(fileobj=file, mode='wb', compresslevel=compression_level)
+        elif compression_format == 'bz2':
+            return bz2.BZ2File(file, 'wb', compresslevel=compression_level)
+        elif compression_format == 'xz':
+            return lzma.LZMAFile(file, 'wb', preset=compression_level)
+        elif compression_format == 'zst':
+            import zstandard
+            compressor = zstandard.ZstdCompressor(level=compression_level, threads=self.COMPRESSION_THREADS)
+            return compressor.stream_writer(file, closefd=False)
+        elif compression_format == 'lz4':
+            import lz4.frame
+            return lz4.frame.LZ4FrameFile(file, 'wb', compression_level=compression_level)
+        raise ValueError('Unsupported compression format {}'.format(compression_format))
+
+    @ staticmethod
+    def _open_compressed_reader(file, compression_format):
+        if compression_format == 'gz':
+            return gzip.GzipFile(fileobj=file, mode='rb')
+        elif compression_format == 'bz2':
+            return bz2.BZ2File(file, 'rb')
+        elif compression_format == 'xz':
+            return lzma.LZMAFile(file, 'rb')
+        elif compression_format == 'zst':
+            import zstandard
+            return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True, closefd=False)
+        elif compression_format == 'lz4':
+            import lz4.frame
+            return lz4.frame.LZ4FrameFile(file, 'rb')
+        raise ValueError('Unsupported compression format {}'.format(compression_format))
+
+    @ contextmanager
+    def _open_tar_stream_for_write(self, file, compression_format, compression_level=None, parallel=False,
+                                   member_spans=None, index=None):
+        compression_level = self.get_compression_level(compression_format, compression_level)
+        if parallel or member_spans is not None:
+            block_size = self.PARALLEL_BLOCK_SIZE if member_spans is None else self.INDEXED_BLOCK_SIZE
+            compress_func = functools.partial(
+                getattr(self, '_compress_block_{}'.format(compression_format)), compression_level=compression_level)
+            with ThreadPoolExecutor(self.COMPRESSION_THREADS) as executor:
+                writer = ParallelBlockWriter(file, compress_func, block_size, executor, 2 * self.COMPRESSION_THREADS)
+                with tarfile.open(fileobj=writer, mode='w|') as t:
+                    yield t
+                writer.close()
+            if member_spans is not None and index is not None:
+                index.update({'format': compression_format, 'block_size': block_size, 'blocks': writer.blocks,
+                              'members': member_spans})
+        else:
+            with self._open_compressed_writer(file, compression_format, compression_level) as writer:
+                with tarfile.open(fileobj=writer, mode='w|') as t:
+                    yield t
+
+    @ contextmanager
+    def _open_tar_for_write(self, tar_file_path, compression_format, compression_level=None, parallel=False,
+                            member_spans=None):
+        self.remove_archive_index(tar_file_path)
+        index = {}
+        with io_metrics.measure('file_compress', 'compress', 'local', compression_format) as measurement:
+            with open(tar_file_path, 'wb') as file:
+                with self._open_tar_stream_for_write(file, compression_format, compression_level, parallel,
+                                                     member_spans, index) as t:
+                    yield t
+                measurement.add_bytes(file.tell())
+        if len(index) > 0:
+            self._save_archive_index(tar_file_path, index)
+
+    @ contextmanager
+    def _open_tar_stream_for_read(self, file, compression_format):
+        with self._open_compressed_reader(file, compression_format) as reader:
+            with tarfile.open(fileobj=reader, mode='r|') as t:
+                yield t
+
+    @ contextmanager
+    def _open_tar_for_read(self, tar_file_path, compression_format):
+        with io_metrics.measure('file_compress', 'decompress', 'local', compression_format) as measurement:
+            if compression_format in self.TARFILE_FORMATS:
+                with tarfile.open(tar_file_path, 'r{}'.format(self.set_compression_format(compression_format))) as t:
+                    yield t
+            else:
+                with open(tar_file_path, 'rb') as file, self._open_tar_stream_for_read(file, compression_format) as t:
+                    yield t
+            measurement.add_bytes(os.path.getsize(tar_file_path))
+
     @ staticmethod
     def dummy_folder_file_filter(file_path, file_name=None):
         return True
@@ -31,7 +359,7 @@ class FileCompress(object):
     def get_filtered_file_folder_list(self, file_path, is_child_file=True, folder_file_filter_func=None):
         if folder_file_filter_func is None:
             folder_file_filter_func = self.dummy_folder_file_filter
-        file_folder_list = os.listdir(file_path)
+        file_folder_list = [file_name for file_name in os.listdir(file_path) if not is_atomic_temp_file(file_name)]
         if is_child_file:
             file_folder_list = [
                 file_name
@@ -44,52 +372,111 @@ class FileCompress(object):
             ]
         return file_folder_list
 
-    def compress_single_file(self, file_path, file_name, compressed_file_name):
+    def compress_single_file(self, file_path, file_name, compressed_file_name, compression_level=None):
         if not os.path.isfile(os.path.join(file_path, file_name)):
             self.logger.error('{} not exist. Unable to compress the file.'.format(os.path.join(file_path, file_name)))
         compression_format = self.get_compression_format_from_file_name(compressed_file_name)
-        format_text = self.set_compression_format(compression_format)
         full_file_path = os.path.join(file_path, file_name)
         tar_file_path = os.path.join(file_path, compressed_file_name)
-        with tarfile.open(tar_file_path, 'w{}'.format(format_text)) as t:
+        with self._open_tar_for_write(tar_file_path, compression_format, compression_level) as t:
             t.add(full_file_path, file_name)
 
-    def compress_single_folder(self, file_path, compressed_file_name, file_filter_func=None):
+    def compress_single_folder(self, file_path, compressed_file_name, file_filter_func=None, compression_level=None,
+                               parallel=False, indexed=False):
         if not os.path.exists(file_path):
             self.logger.error('{} not exist. Unable to compress the folder.'.format(file_path))
         compression_format = self.get_compression_format_from_file_name(compressed_file_name)
-        format_text = self.set_compression_format(compression_format)
         file_list = self.get_filtered_file_folder_list(file_path, True, file_filter_func)
         tar_file_path = os.path.join(file_path, compressed_file_name)
         root_folder = '/' + file_path.split('/')[-1]
-        with tarfile.open(tar_file_path, 'w{}'.format(format_text)) as t:
+        member_spans = {} if indexed else None
+        with self._open_tar_for_write(tar_file_path, compression_format, compression_level, parallel,
+                                      member_spans) as t:
             for file in file_list:
-                t.add(os.path.join(file_path, file), os.path.join(root_folder, file))
+                self._add_to_tar(t, os.path.join(file_path, file), os.path.join(root_folder, file), member_spans)
 
-    def compress_list_of_files(self, full_file_list, root_folder, compressed_file_name):
+    def compress_list_of_files(self, full_file_list, root_folder, compressed_file_name, compression_level=None,
+                               parallel=False, indexed=False):
         if len(full_file_list) > 0:
+            import tqdm
             compression_format = self.get_compression_format_from_file_name(compressed_file_name)
-            format_text = self.set_compression_format(compression_format)
             tar_file_path = os.path.join(root_folder, compressed_file_name)
             rename_file_list = [file_path.replace(root_folder, '') for file_path in full_file_list]
-            with tarfile.open(tar_file_path, 'w{}'.format(format_text)) as t:
+            member_spans = {} if indexed else None
+            with self._open_tar_for_write(tar_file_path, compression_format, compression_level, parallel,
+                                          member_spans) as t:
                 for file, rename_file in zip(tqdm.tqdm(full_file_list), rename_file_list):
-                    t.add(file, rename_file)
+                    self._add_to_tar(t, file, rename_file, member_spans)
         else:
             self.logger.info('No files to be added to {}'.format(compressed_file_name))
 
+    def compress_list_of_files_to_stream(self, full_file_list, root_folder, file, compression_format,
+                                         compression_level=None, parallel=False):
+        import tqdm
+        rename_file_list = [file_path.replace(root_folder, '') for file_path in full_file_list]
+        writer = BackgroundStreamWriter(file, self.STREAM_QUEUE_SIZE)
+        try:
+            with self._open_tar_stream_for_write(writer, compression_format, compression_level, parallel) as t:
+                for full_path, rename_file in zip(tqdm.tqdm(full_file_list), rename_file_list):
+                    t.add(full_path, rename_file)
+        finally:
+            writer.close()
+
+    def extract_compressed_stream(self, file, compression_format, root_folder):
+        reader = BackgroundStreamReader(file, self.STREAM_READ_SIZE, self.STREAM_QUEUE_SIZE)
+        try:
+            with self._open_tar_stream_for_read(reader, compression_format) as t:
+                t.extractall(root_folder)
+        finally:
+            reader.close()
+
     def extract_compressed_file(self, compressed_file_name, root_folder):
         compression_format = self.get_compression_format_from_file_name(compressed_file_name)
-        format_text = self.set_compression_format(compression_format)
         tar_file_path = os.path.join(root_folder, compressed_file_name)
-        with tarfile.open(tar_file_path, 'r{}'.format(format_text)) as t:
+        with self._open_tar_for_read(tar_file_path, compression_format) as t:
             t.extractall(root_folder)
 
-    def list_files_in_compressed_file(self, compressed_file_name, root_folder):
+    def _read_indexed_member_span(self, tar_file_path, index, member_name):
+        start_offset, end_offset = index['members'][member_name]
+        block_size = index['block_size']
+        start_block, end_block = start_offset // block_size, (end_offset - 1) // block_size
+        decompress_func = getattr(self, '_decompress_block_{}'.format(index['format']))
+        data = bytearray()
+        with open(tar_file_path, 'rb') as file:
+            for compressed_offset, compressed_length in index['blocks'][start_block:end_block + 1]:
+                file.seek(compressed_offset)
+                data += decompress_func(file.read(compressed_length))
+        span_offset = start_offset - start_block * block_size
+        return bytes(data[span_offset:span_offset + end_offset - start_offset]) + tarfile.NUL * 2 * tarfile.BLOCKSIZE
+
+    def extract_member(self, compressed_file_name, root_folder, member_name, extract_folder=None):
+        if extract_folder is None:
+            extract_folder = root_folder
+        member_name = member_name.lstrip('/')
+        tar_file_path = os.path.join(root_folder, compressed_file_name)
+        index = self.load_archive_index(tar_file_path)
+        if index is not None:
+            if member_name not in index['members']:
+                raise KeyError('{} not found in {}'.format(member_name, compressed_file_name))
+            span = self._read_indexed_member_span(tar_file_path, index, member_name)
+            with tarfile.open(fileobj=io.BytesIO(span), mode='r:') as t:
+                t.extract(t.getmember(member_name), extract_folder)
+            return
         compression_format = self.get_compression_format_from_file_name(compressed_file_name)
-        format_text = self.set_compression_format(compression_format)
+        with self._open_tar_for_read(tar_file_path, compression_format) as t:
+            for member in t:
+                if member.name == member_name:
+                    t.extract(member, extract_folder)
+                    return
+        raise KeyError('{} not found in {}'.format(member_name, compressed_file_name))
+
+    def list_files_in_compressed_file(self, compressed_file_name, root_folder):
         tar_file_path = os.path.join(root_folder, compressed_file_name)
-        with tarfile.open(tar_file_path, 'r{}'.format(format_text)) as t:
+        index = self.load_archive_index(tar_file_path)
+        if index is not None:
+            return list(index['members'].keys())
+        compression_format = self.get_compression_format_from_file_name(compressed_file_name)
+        with self._open_tar_for_read(tar_file_path, compression_format) as t:
             file_list = t.getnames()
         return file_list
 
@@ -0,0 +1,205 @@
+import os
+import json
+import hashlib
+from bisect import bisect_left, bisect_right
+from storage_backend import is_atomic_temp_file
+
+
+def scan_modified_time(path):
+    with os.scandir(path) as entries:
+        return {entry.name: entry.stat().st_mtime for entry in entries
+                if entry.is_file() and not is_atomic_temp_file(entry.name)}
+
+
+class FolderModifiedTimeIndex(object):
+
+    INDEX_FILE_PREFIX = 'fileio_mtime_index_'
+
+    def __init__(self, path, index_folder):
+        self.path = path
+        self.index_file = os.path.join(index_folder, self.get_index_file_name(path))
+        self.folder_mtime = None
+        self.modified_time = {}
+        self.mtime_list = []
+        self.name_list = []
+        self.dirty = False
+
+    @ classmethod
+    def get_index_file_name(cls, path):
+        return cls.INDEX_FILE_PREFIX + hashlib.md5(os.path.abspath(path).encode('utf-8')).hexdigest() + '.json'
+
+    def _get_folder_mtime(self):
+        return os.stat(self.path).st_mtime_ns
+
+    def _rebuild_sorted_list(self):
+        sorted_entries = sorted((mtime, name) for name, mtime in self.modified_time.items())
+        self.mtime_list = [mtime for mtime, _ in sorted_entries]
+        self.name_list = [name for _, name in sorted_entries]
+
+    def load(self):
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            if index.get('path') == self.path:
+                self.folder_mtime = index['folder_mtime']
+                self.modified_time = index['modified_time']
+                self._rebuild_sorted_list()
+
+    def save(self):
+        if not self.dirty:
+            return
+        index_folder = os.path.dirname(self.index_file)
+        if not os.path.exists(index_folder):
+            os.makedirs(index_folder)
+        temp_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump({'path': self.path, 'folder_mtime': self.folder_mtime, 'modified_time': self.modified_time},
+                      file)
+        os.replace(temp_file, self.index_file)
+        self.dirty = False
+
+    def _remove_sorted_entry(self, file_name):
+        mtime = self.modified_time.pop(file_name)
+        position = bisect_left(self.mtime_list, mtime)
+        while self.name_list[position] != file_name:
+            position += 1
+        del self.mtime_list[position]
+        del self.name_list[position]
+
+    def _insert_sorted_entry(self, file_name, mtime):
+        position = bisect_right(self.mtime_list, mtime)
+        self.mtime_list.insert(position, mtime)
+        self.name_list.insert(position, file_name)
+        self.modified_time[file_name] = mtime
+
+    def sync(self, force=False):
+        folder_mtime = self._get_folder_mtime()
+        if force or folder_mtime != self.folder_mtime:
+            self.modified_time = scan_modified_time(self.path)
+            self._rebuild_sorted_list()
+            self.folder_mtime = folder_mtime
+            self.dirty = True
+        self.save()
+
+    def _sync_file_names(self):
+        with os.scandir(self.path) as entries:
+            file_names = set(entry.name for entry in entries
+                             if entry.is_file() and not is_atomic_temp_file(entry.name))
+        for file_name in [file_name for file_name in self.modified_time if file_name not in file_names]:
+            self._remove_sorted_entry(file_name)
+        for file_name in file_names - set(self.modified_time):
+            try:
+                self._insert_sorted_entry(file_name, os.stat(os.path.join(self.path, file_name)).st_mtime)
+            except FileNotFoundError:
+                pass
+
+    def update(self, file_name):
+        full_path = os.path.join(self.path, file_name)
+        if file_name in self.modified_time:
+            self._remove_sorted_entry(file_name)
+        if os.path.isfile(full_path):
+            self._insert_sorted_entry(file_name, os.stat(full_path).st_mtime)
+        if self.folder_mtime is not None:
+            folder_mtime = self._get_folder_mtime()
+            if folder_mtime != self.folder_mtime:
+                self._sync_file_names()
+                self.folder_mtime = folder_mtime
+        self.dirty = True
+
+    def list_modified_files_after_time(self, time_stamp):
+        self.sync()
+        return self.name_list[bisect_right(self.mtime_list, time_stamp):]
+
+    def list_modified_files_between_time(self, start_time_stamp, end_time_stamp):
+        self.sync()
+        return self.name_list[bisect_left(self.mtime_list, start_time_stamp):
+                              bisect_left(self.mtime_list, end_time_stamp)]
+
+
+def hash_content(content):
+    try:
+        import xxhash
+        return 'xxh3:' + xxhash.xxh3_128_hexdigest(content)
+    except ImportError:
+        return 'blake2b:' + hashlib.blake2b(content, digest_size=16).hexdigest()
+
+
+class FolderContentHashIndex(object):
+
+    INDEX_FILE_PREFIX = 'fileio_hash_index_'
+
+    def __init__(self, path, index_folder):
+        self.path = path
+        self.index_file = os.path.join(index_folder, self.get_index_file_name(path))
+        self.entries = {}
+        self.names_by_hash = {}
+        self.dirty = False
+
+    @ classmethod
+    def get_index_file_name(cls, path):
+        return cls.INDEX_FILE_PREFIX + hashlib.md5(path.encode('utf-8')).hexdigest() + '.json'
+
+    def _set_entries(self, entries):
+        self.entries = entries
+        self.names_by_hash = {}
+        for file_name, entry in self.entries.items():
+            self.names_by_hash.setdefault(entry['hash'], set()).add(file_name)
+
+    def load(self):
+        if os.path.isfile(self.index_file):
+            with open(self.index_file, 'r', encoding='utf-8') as file:
+                index = json.load(file)
+            if index.get('path') == self.path:
+                self._set_entries(index['entries'])
+
+    @ classmethod
+    def load_all(cls, index_folder, exclude_paths=None):
+        exclude_paths = exclude_paths or set()
+        hash_indexes = []
+        if not os.path.isdir(index_folder):
+            return hash_indexes
+        with os.scandir(index_folder) as index_files:
+            for index_file in index_files:
+                if not index_file.name.startswith(cls.INDEX_FILE_PREFIX) or not index_file.name.endswith('.json'):
+                    continue
+                try:
+                    with open(index_file.path, 'r', encoding='utf-8') as file:
+                        index = json.load(file)
+                except (OSError, ValueError):
+                    continue
+                if index.get('path') in exclude_paths or not os.path.isdir(index.get('path') or ''):
+                    continue
+                hash_index = cls(index['path'], index_folder)
+                hash_index._set_entries(index['entries'])
+                hash_indexes.append(hash_index)
+        return hash_indexes
+
+    def save(self):
+        if not self.dirty:
+            return
+        index_folder = os.path.dirname(self.index_file)
+        if not os.path.exists(index_folder):
+            os.makedirs(index_folder)
+        temp_file = '{}.{}.tmp'.format(self.index_file, os.getpid())
+        with open(temp_file, 'w', encoding='utf-8') as file:
+            json.dump({'path': self.path, 'entries': self.entries}, file)
+        os.replace(temp_file, self.index_file)
+        self.dirty = False
+
+    def get(self, file_name):
+        return self.entries.get(file_name)
+
+    def remove(self, file_name):
+        entry = self.entries.pop(file_name, None)
+        if entry is not None:
+            self.names_by_hash[entry['hash']].discard(file_name)
+            self.dirty = True
+
+    def update(self, file_name, content_hash, stamp):
+        self.remove(file_name)
+        self.entries[file_name] = {'hash': content_hash, 'stamp': stamp}
+        self.names_by_hash.setdefault(content_hash, set()).add(file_name)
+        self.dirty = True
+
+    def find(self, content_hash):
+        return list(self.names_by_hash.get(content_hash, []))
@@ -1,72 +1,253 @@
 import os
 import sys
-import redis
 sys.path.append(os.environ['SCTYS_PROJECT'] + '/sctys_global_parameters')
 from global_parameters import Path
 sys.path.append(Path.NOTIFIER_PROJECT)
 sys.path.append(Path.UTILITIES_PROJECT)
-from notifiers import get_notifier
-from utilities_functions import convert_datetime_to_timestamp
-import pandas as pd
-import pyarrow
-import pickle
-import json
+import operator
 import time
-import joblib
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import uuid
+import fcntl
+import atexit
+import weakref
+import asyncio
+import functools
+import threading
+from contextlib import contextmanager
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from file_index import FolderModifiedTimeIndex, FolderContentHashIndex, hash_content, scan_modified_time
+from redis_counter import RedisCounter
+from load_cache import LoadCache
+from storage_backend import LocalBackend, ATOMIC_TEMP_PREFIX, is_atomic_temp_file
+from format_codec import get_codec
+from io_metrics import io_metrics
+from retry_queue import RetryQueue
+
+
+FICLONE = 0x40049409
+
+
+def _get_atomic_temp_path(full_path):
+    folder, file_name = os.path.split(full_path)
+    return os.path.join(folder, '{}{}-{}'.format(ATOMIC_TEMP_PREFIX, uuid.uuid4().hex, file_name))
+
+
+def _fsync_path(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _break_hardlink(full_path):
+    try:
+        if os.stat(full_path).st_nlink > 1:
+            os.remove(full_path)
+    except FileNotFoundError:
+        pass
+
+
+def _write_file(save_func, data, full_path, kwargs, atomic=False, fsync=False, defer_commit=False,
+                local_path=False):
+    if not atomic:
+        if local_path:
+            _break_hardlink(full_path)
+        save_func(data, full_path, **kwargs)
+        if fsync:
+            _fsync_path(full_path)
+        return None
+    temp_path = _get_atomic_temp_path(full_path)
+    try:
+        save_func(data, temp_path, **kwargs)
+        if defer_commit:
+            return temp_path
+        if fsync:
+            _fsync_path(temp_path)
+        os.replace(temp_path, full_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    if fsync:
+        _fsync_path(os.path.dirname(full_path) or '.')
+    return None
+
+
+def _reflink_file(source_path, target_path):
+    with open(source_path, 'rb') as source_file, open(target_path, 'wb') as target_file:
+        try:
+            fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        except OSError:
+            return False
+
+
+def _save_hash_indexes_at_exit(file_io_ref):
+    file_io = file_io_ref()
+    if file_io is not None:
+        file_io.save_hash_indexes()
+
+
+def _process_save_file(file_io_class, data, full_path, file_type, kwargs, write_options, measure=False):
+    io_metrics.enabled = measure
+    measurement = io_metrics.measure('file_io', 'save', file_io_class.BACKEND.NAME, file_type)
+    try:
+        with measurement:
+            save_func = functools.partial(file_io_class.BACKEND.save, get_codec(file_type))
+            result = True, _write_file(save_func, data, full_path, kwargs, *write_options)
+    except Exception as e:
+        result = False, str(e)
+    return result + (measurement.get_record() if measure else None,)
+
+
+def _process_load_file(file_io_class, full_path, file_type, kwargs, measure=False):
+    io_metrics.enabled = measure
+    measurement = io_metrics.measure('file_io', 'load', file_io_class.BACKEND.NAME, file_type)
+    try:
+        with measurement:
+            result = True, file_io_class.BACKEND.load(get_codec(file_type), full_path, **kwargs)
+    except Exception as e:
+        result = False, str(e)
+    return result + (measurement.get_record() if measure else None,)
 
 
 class FileIO(object):
 
     NOTIFIER = 'slack'
+    BACKEND = LocalBackend()
     DATA_PATH = Path.DATA_FOLDER
-    PREFIX_FAIL_SAVE_LIST = 'fileio_fail_save_list_'
-    PREFIX_FAIL_LOAD_LIST = 'fileio_fail_load_list_'
+    NO_THREAD_WORKERS = 32
+    NO_PROCESS_WORKERS = os.cpu_count()
+    BATCH_IN_FLIGHT_FACTOR = 2
+    PROCESS_FILE_TYPES = ['pickle', 'parquet', 'csv']
+    ASYNC_MAX_CONCURRENCY = 100
+    USE_MTIME_INDEX = False
+    ATOMIC_WRITE = False
+    ATOMIC_TEMP_MAX_AGE = 3600
+    FSYNC_MODE = None
+    CONTENT_HASH = False
+    CONTENT_HASH_FILE_TYPES = ['txt', 'html', 'json', 'binary']
+    DEDUP_LINK_MODE = 'reflink'
+    HASH_INDEX_FOLDER = os.path.join(Path.TEMP_FOLDER, 'fileio_hash_index')
+    HASH_INDEX_SAVE_INTERVAL = 5
+    USE_LOAD_CACHE = False
+    LOAD_CACHE_MAX_BYTES = 512 * 2 ** 20
+    MTIME_INDEX_FOLDER = os.path.join(Path.TEMP_FOLDER, 'fileio_mtime_index')
+    RETRY_QUEUE_FOLDER = os.path.join(Path.TEMP_FOLDER, 'fileio_retry_queue')
+    RETRY_MAX_ATTEMPTS = 5
+    RETRY_BACKOFF = 60
+    RETRY_MAX_BACKOFF = 3600
+    REDIS_HOST = 'localhost'
+    REDIS_PORT = 6379
+    REDIS_DB = 0
+    REDIS_FLUSH_INTERVAL = 5
+    REDIS_FLUSH_THRESHOLD = 1000
+    CSV_CHUNK_SIZE = 100000
+    PARQUET_BATCH_SIZE = 100000
+    FILTER_OPERATORS = {'=': operator.eq, '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+                        '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+                        'in': lambda series, value: series.isin(value),
+                        'not in': lambda series, value: ~series.isin(value)}
 
-    def __init__(self, project, logger):
+    def __init__(self, project, logger, backend=None):
         self.project = project
         self.logger = logger
+        self.backend = backend or self.BACKEND
         self.redis = None
+        self.redis_counter = None
         self.notifier = None
         self.fail_save_list = []
         self.fail_load_list = []
+        self.use_mtime_index = self.USE_MTIME_INDEX
+        self.mtime_indexes = {}
+        self.mtime_index_lock = threading.Lock()
+        self.atomic_write = self.ATOMIC_WRITE
+        self.fsync_mode = self.FSYNC_MODE
+        self.atomic_batch_depth = 0
+        self.pending_atomic_writes = []
+        self.pending_atomic_lock = threading.Lock()
+        self.temp_cleaned_folders = set()
+        self.content_hash = self.CONTENT_HASH
+        self.dedup_link_mode = self.DEDUP_LINK_MODE
+        self.hash_indexes = {}
+        self.hash_index_lock = threading.Lock()
+        self.hash_index_save_time = 0
+        self.all_hash_indexes_loaded = False
+        self.hash_index_exit_registered = False
+        self.load_cache = LoadCache(self.LOAD_CACHE_MAX_BYTES) if self.USE_LOAD_CACHE else None
+        self.retry_queue = None
 
     def init_redis(self):
         if self.redis is None:
-            self.redis = redis.Redis(host='localhost', port=6379, db=0)
+            import redis
+            self.redis = redis.Redis(host=self.REDIS_HOST, port=self.REDIS_PORT, db=self.REDIS_DB)
+
+    def get_redis_counter(self):
+        if self.redis_counter is None:
+            self.init_redis()
+            self.redis_counter = RedisCounter.get_shared_counter(
+                self.redis, self.logger, self.REDIS_FLUSH_INTERVAL, self.REDIS_FLUSH_THRESHOLD)
+        return self.redis_counter
 
     @ staticmethod
     def list_files_in_folder(path):
-        return os.listdir(path)
+        return FileIO.BACKEND.list_files(path)
 
     @ staticmethod
     def check_if_folder_exist(path):
-        return os.path.exists(path)
+        return FileIO.BACKEND.folder_exists(path)
 
     @ staticmethod
     def create_directory_if_not_exist(path):
-        if not os.path.exists(path):
-            os.makedirs(path)
+        FileIO.BACKEND.makedirs(path)
 
-    @staticmethod
+    @ staticmethod
     def check_if_file_exists(path, file_name):
-        full_file_name = os.path.join(path, file_name)
-        file_exist = os.path.isfile(full_file_name)
-        return file_exist
+        return FileIO.BACKEND.exists(os.path.join(path, file_name))
+
+    def list_files_in_backend_folder(self, path):
+        if self.backend is self.BACKEND:
+            return self.list_files_in_folder(path)
+        return self.backend.list_files(path)
+
+    def check_if_backend_folder_exist(self, path):
+        if self.backend is self.BACKEND:
+            return self.check_if_folder_exist(path)
+        return self.backend.folder_exists(path)
+
+    def create_backend_directory_if_not_exist(self, path):
+        if self.backend is self.BACKEND:
+            return self.create_directory_if_not_exist(path)
+        self.backend.makedirs(path)
+
+    def check_if_backend_file_exists(self, path, file_name):
+        if self.backend is self.BACKEND:
+            return self.check_if_file_exists(path, file_name)
+        return self.backend.exists(os.path.join(path, file_name))
+
+    def _check_local_backend(self, operation):
+        if not self.backend.LOCAL_PATH:
+            raise NotImplementedError('{} backend does not support {}'.format(self.backend.NAME, operation))
 
     def get_module_name_from_file_path(self, file_path):
         return '_'.join(file_path.replace(self.DATA_PATH, '').split('/')[1:3])
         # return file_path.split(self.project)[-1].split('/')[1:2][0]
 
     def delete_file(self, path, file_name):
-        if self.check_if_file_exists(path, file_name):
-            os.remove(os.path.join(path, file_name))
+        if self.check_if_backend_file_exists(path, file_name):
+            self.backend.remove(os.path.join(path, file_name))
+            self.update_mtime_index(path, file_name)
+            if self.load_cache is not None:
+                self.load_cache.invalidate(os.path.join(path, file_name))
 
     def check_modified_time(self, path, file_name=None):
+        self._check_local_backend('check_modified_time')
         if file_name is not None:
-            path_exist = self.check_if_file_exists(path, file_name)
+            path_exist = self.check_if_backend_file_exists(path, file_name)
         else:
-            path_exist = self.check_if_folder_exist(path)
+            path_exist = self.check_if_backend_folder_exist(path)
         if path_exist:
             if file_name is not None:
                 path = os.path.join(path, file_name)
@@ -75,44 +256,335 @@ class FileIO(object):
             self.logger.info('{} not exist. Unable to get the modified time'.format(path))
             return None
 
+    def get_mtime_index(self, path):
+        if path not in self.mtime_indexes:
+            mtime_index = FolderModifiedTimeIndex(path, self.MTIME_INDEX_FOLDER)
+            mtime_index.load()
+            self.mtime_indexes[path] = mtime_index
+        return self.mtime_indexes[path]
+
+    def update_mtime_index(self, path, file_name):
+        if path in self.mtime_indexes:
+            with self.mtime_index_lock:
+                self.mtime_indexes[path].update(file_name)
+
+    def save_mtime_indexes(self):
+        for mtime_index in self.mtime_indexes.values():
+            mtime_index.save()
+
     def list_modified_files_after_time(self, path, cutoff_date_time):
-        if not self.check_if_folder_exist(path):
+        self._check_local_backend('list_modified_files_after_time')
+        if not self.check_if_backend_folder_exist(path):
             return []
+        from utilities_functions import convert_datetime_to_timestamp
         time_stamp = convert_datetime_to_timestamp(cutoff_date_time)
-        file_list = [file for file in os.listdir(path) if self.check_modified_time(path, file) > time_stamp]
+        if self.use_mtime_index:
+            return self.get_mtime_index(path).list_modified_files_after_time(time_stamp)
+        file_list = [file for file, modified_time in scan_modified_time(path).items() if modified_time > time_stamp]
         return file_list
 
     def list_modified_files_between_time(self, path, cutoff_start_time, cutoff_end_time):
-        if not self.check_if_folder_exist(path):
+        self._check_local_backend('list_modified_files_between_time')
+        if not self.check_if_backend_folder_exist(path):
             return []
+        from utilities_functions import convert_datetime_to_timestamp
         start_time_stamp = convert_datetime_to_timestamp(cutoff_start_time)
         end_time_stamp = convert_datetime_to_timestamp(cutoff_end_time)
-        file_list = [file for file in os.listdir(path)
-                     if start_time_stamp <= self.check_modified_time(path, file) < end_time_stamp]
+        if self.use_mtime_index:
+            return self.get_mtime_index(path).list_modified_files_between_time(start_time_stamp, end_time_stamp)
+        file_list = [file for file, modified_time in scan_modified_time(path).items()
+                     if start_time_stamp <= modified_time < end_time_stamp]
         return file_list
 
-    def count_file_in_redis(self, folder_path):
-        if self.redis is None:
-            self.init_redis()
+    def count_file_in_redis(self, folder_path, count=1):
         module = self.get_module_name_from_file_path(folder_path)
-        self.redis.incr(module)
+        self.get_redis_counter().incr(module, count)
+
+    def get_file_count_in_redis(self, folder_path):
+        module = self.get_module_name_from_file_path(folder_path)
+        return self.get_redis_counter().get_count(module)
+
+    def flush_file_count_in_redis(self):
+        if self.redis_counter is not None:
+            self.redis_counter.flush()
+
+    def set_atomic_write(self, atomic_write=True, fsync_mode=None):
+        if fsync_mode not in [None, 'file', 'batch']:
+            raise ValueError('Unknown fsync mode {}'.format(fsync_mode))
+        self.atomic_write = atomic_write
+        self.fsync_mode = fsync_mode
+
+    def _get_write_options(self):
+        if not self.backend.LOCAL_PATH:
+            return False, False, False, False
+        defer_commit = self.atomic_write and self.fsync_mode == 'batch' and self.atomic_batch_depth > 0
+        return self.atomic_write, self.fsync_mode is not None, defer_commit, True
+
+    def remove_stale_atomic_temp_files(self, path, max_age=None):
+        if max_age is None:
+            max_age = self.ATOMIC_TEMP_MAX_AGE
+        cutoff_time = time.time() - max_age
+        try:
+            with os.scandir(path) as entries:
+                stale_paths = [entry.path for entry in entries if is_atomic_temp_file(entry.name) and
+                               entry.is_file() and entry.stat().st_mtime < cutoff_time]
+        except FileNotFoundError:
+            return
+        for stale_path in stale_paths:
+            try:
+                os.remove(stale_path)
+                self.logger.debug('Stale temp file {} removed.'.format(stale_path))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                self.logger.error('Error in removing stale temp file {}. {}'.format(stale_path, e))
+
+    def _prepare_atomic_folder(self, path):
+        if not self.atomic_write or not self.backend.LOCAL_PATH or path in self.temp_cleaned_folders:
+            return
+        self.temp_cleaned_folders.add(path)
+        self.remove_stale_atomic_temp_files(path)
+
+    def _add_pending_atomic_write(self, temp_path, file_path, file_name, content_digest=None):
+        with self.pending_atomic_lock:
+            self.pending_atomic_writes.append((temp_path, file_path, file_name, content_digest))
+
+    def _finish_save(self, file_path, file_name, content_digest=None):
+        self.update_mtime_index(file_path, file_name)
+        if self.load_cache is not None:
+            self.load_cache.invalidate(os.path.join(file_path, file_name))
+        if content_digest is not None:
+            self.record_content_hash(file_path, file_name, *content_digest)
+
+    @ staticmethod
+    def set_io_metrics(enabled=True):
+        io_metrics.enabled = enabled
+
+    @ staticmethod
+    def reset_io_metrics():
+        io_metrics.reset()
+
+    @ staticmethod
+    def export_io_metrics(output_format='json'):
+        if output_format == 'json':
+            return io_metrics.export_json()
+        if output_format == 'prometheus':
+            return io_metrics.export_prometheus()
+        raise ValueError('Unknown metrics output format {}'.format(output_format))
+
+    def measure_io(self, operation, file_type=None):
+        return io_metrics.measure('file_io', operation, self.backend.NAME, file_type)
+
+    def _save_to_full_path(self, data, file_path, file_name, file_type, **kwargs):
+        with self.measure_io('save', file_type) as measurement:
+            content_digest = self.get_content_digest(data, file_type, **kwargs)
+            if content_digest is not None:
+                if self.check_content_unchanged(file_path, file_name, content_digest[0]):
+                    self.logger.debug('{} unchanged. Skip saving.'.format(os.path.join(file_path, file_name)))
+                    measurement.set_status('unchanged')
+                    return False
+                if self._link_duplicate_file(file_path, file_name, content_digest[0]):
+                    self._finish_save(file_path, file_name, content_digest)
+                    measurement.set_status('linked')
+                    return True
+            self._prepare_atomic_folder(file_path)
+            save_func = functools.partial(self.backend.save, get_codec(file_type))
+            temp_path = _write_file(save_func, data, os.path.join(file_path, file_name), kwargs,
+                                    *self._get_write_options())
+        if temp_path is not None:
+            self._add_pending_atomic_write(temp_path, file_path, file_name, content_digest)
+        else:
+            self._finish_save(file_path, file_name, content_digest)
+        return True
+
+    def set_content_hash(self, content_hash=True, dedup_link_mode='reflink'):
+        if dedup_link_mode not in [None, 'reflink', 'hardlink']:
+            raise ValueError('Unknown dedup link mode {}'.format(dedup_link_mode))
+        self.content_hash = content_hash
+        self.dedup_link_mode = dedup_link_mode
+
+    def get_hash_index(self, path):
+        with self.hash_index_lock:
+            if path not in self.hash_indexes:
+                hash_index = FolderContentHashIndex(path, self.HASH_INDEX_FOLDER)
+                hash_index.load()
+                self.hash_indexes[path] = hash_index
+                if not self.hash_index_exit_registered:
+                    atexit.register(_save_hash_indexes_at_exit, weakref.ref(self))
+                    self.hash_index_exit_registered = True
+            return self.hash_indexes[path]
+
+    def load_all_hash_indexes(self):
+        with self.hash_index_lock:
+            if self.all_hash_indexes_loaded:
+                return
+            for hash_index in FolderContentHashIndex.load_all(self.HASH_INDEX_FOLDER, set(self.hash_indexes)):
+                self.hash_indexes[hash_index.path] = hash_index
+            self.all_hash_indexes_loaded = True
+
+    def save_hash_indexes(self):
+        with self.hash_index_lock:
+            for hash_index in self.hash_indexes.values():
+                hash_index.save()
+            self.hash_index_save_time = time.time()
+
+    def _save_hash_indexes_if_due(self):
+        if self.atomic_batch_depth == 0 and time.time() - self.hash_index_save_time >= self.HASH_INDEX_SAVE_INTERVAL:
+            self.save_hash_indexes()
+
+    def get_content_digest(self, data, file_type, **kwargs):
+        if not self.content_hash or file_type not in self.CONTENT_HASH_FILE_TYPES:
+            return None
+        content = get_codec(file_type).dump_to_bytes(data, **kwargs)
+        return hash_content(content), len(content)
+
+    def get_file_stamp(self, path, file_name):
+        return self.backend.get_stamp(os.path.join(path, file_name))
+
+    def get_saved_file_stamp(self, path, file_name, size):
+        return self.get_file_stamp(path, file_name)
+
+    def _check_hash_entry(self, path, file_name, content_hash):
+        entry = self.get_hash_index(path).get(file_name)
+        return entry is not None and entry['hash'] == content_hash and entry['stamp'] == self.get_file_stamp(
+            path, file_name)
+
+    def check_content_unchanged(self, path, file_name, content_hash):
+        return self._check_hash_entry(path, file_name, content_hash)
+
+    def record_content_hash(self, path, file_name, content_hash, size):
+        stamp = self.get_saved_file_stamp(path, file_name, size)
+        hash_index = self.get_hash_index(path)
+        with self.hash_index_lock:
+            hash_index.update(file_name, content_hash, stamp)
+        self._save_hash_indexes_if_due()
+
+    def _find_duplicate_files(self, content_hash):
+        self.load_all_hash_indexes()
+        with self.hash_index_lock:
+            hash_indexes = list(self.hash_indexes.values())
+        for hash_index in hash_indexes:
+            for file_name in hash_index.find(content_hash):
+                if self._check_hash_entry(hash_index.path, file_name, content_hash):
+                    yield os.path.join(hash_index.path, file_name)
+
+    def _link_duplicate_file(self, file_path, file_name, content_hash):
+        if self.dedup_link_mode is None or not self.backend.LOCAL_PATH:
+            return False
+        full_path = os.path.join(file_path, file_name)
+        for source_path in self._find_duplicate_files(content_hash):
+            if source_path == full_path:
+                continue
+            temp_path = _get_atomic_temp_path(full_path)
+            try:
+                if self.dedup_link_mode == 'hardlink' and self.atomic_write:
+                    os.link(source_path, temp_path)
+                elif not _reflink_file(source_path, temp_path):
+                    os.remove(temp_path)
+                    return False
+                os.replace(temp_path, full_path)
+            except OSError as e:
+                self.logger.debug('Unable to link {} to {}. {}'.format(source_path, full_path, e))
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                return False
+            if self.fsync_mode is not None:
+                _fsync_path(file_path or '.')
+            self.logger.debug('{} linked to duplicate {}.'.format(full_path, source_path))
+            return True
+        return False
+
+    @ contextmanager
+    def atomic_batch(self):
+        self.atomic_batch_depth += 1
+        try:
+            yield self
+        finally:
+            self.atomic_batch_depth -= 1
+            if self.atomic_batch_depth == 0:
+                self._end_atomic_batch()
+
+    def _end_atomic_batch(self):
+        self.commit_atomic_writes()
+        self.save_hash_indexes()
+
+    def commit_atomic_writes(self):
+        with self.pending_atomic_lock:
+            pending_writes = self.pending_atomic_writes
+            self.pending_atomic_writes = []
+        if len(pending_writes) == 0:
+            return
+        with ThreadPoolExecutor(max_workers=self.NO_THREAD_WORKERS) as executor:
+            list(executor.map(_fsync_path, [temp_path for temp_path, _, _, _ in pending_writes]))
+        for temp_path, file_path, file_name, content_digest in pending_writes:
+            os.replace(temp_path, os.path.join(file_path, file_name))
+            self._finish_save(file_path, file_name, content_digest)
+        for file_path in set(file_path for _, file_path, _, _ in pending_writes):
+            _fsync_path(file_path or '.')
+        self.logger.debug('Committed {} atomic writes.'.format(len(pending_writes)))
 
     def save_file(self, data, file_path, file_name, file_type, count_file=False, **kwargs):
         full_path = os.path.join(file_path, file_name)
         try:
-            getattr(self, '_save_{}_file'.format(file_type))(data, full_path, **kwargs)
+            if not self._save_to_full_path(data, file_path, file_name, file_type, **kwargs):
+                return True
             self.logger.debug('{} saved.'.format(full_path))
             if count_file:
                 self.count_file_in_redis(file_path)
+            return True
         except Exception as e:
             self.logger.error('Error in saving file {}. {}'.format(full_path, e))
             self.fail_save_list.append({'data': data, 'file_path': file_path, 'file_name': file_name,
-                                        'file_type': file_type, 'kwargs': kwargs})
+                                        'file_type': file_type, 'count_file': count_file, 'kwargs': kwargs})
+            return False
+
+    def set_load_cache(self, enabled=True, max_bytes=None):
+        if not enabled:
+            self.load_cache = None
+        elif self.load_cache is None:
+            self.load_cache = LoadCache(max_bytes or self.LOAD_CACHE_MAX_BYTES)
+        elif max_bytes is not None:
+            self.load_cache.resize(max_bytes)
+
+    def get_load_cache_stats(self):
+        if self.load_cache is None:
+            return None
+        return self.load_cache.get_stats()
+
+    def get_cache_stamp(self, path, file_name):
+        return self.get_file_stamp(path, file_name)
+
+    def _load_with_cache(self, file_path, file_name, file_type, **kwargs):
+        full_path = os.path.join(file_path, file_name)
+        cache_key = LoadCache.get_cache_key(full_path, file_type, kwargs)
+        stamp = self.get_cache_stamp(file_path, file_name)
+        hit, data = self.load_cache.get(cache_key, stamp)
+        if hit:
+            return data
+        data = self._load_from_backend(full_path, file_type, **kwargs)
+        return self.load_cache.put(cache_key, stamp, data, stamp[0] if stamp is not None else 0)
+
+    async def _async_load_with_cache(self, file_path, file_name, file_type, **kwargs):
+        full_path = os.path.join(file_path, file_name)
+        cache_key = LoadCache.get_cache_key(full_path, file_type, kwargs)
+        stamp = await self._run_in_executor(self.get_cache_stamp, file_path, file_name)
+        hit, data = self.load_cache.get(cache_key, stamp)
+        if hit:
+            return data
+        data = await self._async_load(full_path, file_type, **kwargs)
+        return self.load_cache.put(cache_key, stamp, data, stamp[0] if stamp is not None else 0)
+
+    def _load_from_backend(self, full_path, file_type, **kwargs):
+        with self.measure_io('load', file_type):
+            return self.backend.load(get_codec(file_type), full_path, **kwargs)
 
     def load_file(self, file_path, file_name, file_type, **kwargs):
         full_path = os.path.join(file_path, file_name)
         try:
-            data = getattr(self, '_load_{}_file'.format(file_type))(full_path, **kwargs)
+            if self.load_cache is not None:
+                data = self._load_with_cache(file_path, file_name, file_type, **kwargs)
+            else:
+                data = self._load_from_backend(full_path, file_type, **kwargs)
             self.logger.debug('{} loaded'.format(full_path))
         except Exception as e:
             data = None
@@ -121,6 +593,73 @@ class FileIO(object):
                                         'file_type': file_type, 'kwargs': kwargs})
         return data
 
+    def iter_load_file(self, file_path, file_name, file_type, chunk_size=None, columns=None, filters=None,
+                       as_arrow=False, **kwargs):
+        full_path = os.path.join(file_path, file_name)
+        try:
+            yield from getattr(self, '_iter_load_{}_file'.format(file_type))(
+                full_path, chunk_size, columns, filters, as_arrow, **kwargs)
+            self.logger.debug('{} loaded'.format(full_path))
+        except Exception as e:
+            self.logger.error('Error in loading file {}. {}'.format(full_path, e))
+            self.fail_load_list.append({'file_path': file_path, 'file_name': file_name,
+                                        'file_type': file_type, 'kwargs': kwargs})
+
+    @ classmethod
+    def _filter_dataframe(cls, data, filters):
+        if len(filters) > 0 and isinstance(filters[0], tuple):
+            filters = [filters]
+        import pandas as pd
+        mask = pd.Series(False, index=data.index)
+        for conjunction in filters:
+            conjunction_mask = pd.Series(True, index=data.index)
+            for column, op, value in conjunction:
+                conjunction_mask &= cls.FILTER_OPERATORS[op](data[column], value)
+            mask |= conjunction_mask
+        return data[mask]
+
+    @ staticmethod
+    def _get_filter_columns(filters):
+        if len(filters) > 0 and isinstance(filters[0], tuple):
+            filters = [filters]
+        return [column for conjunction in filters for column, _, _ in conjunction]
+
+    def _iter_load_csv_file(self, full_path, chunk_size=None, columns=None, filters=None, as_arrow=False,
+                            **kwargs):
+        if columns is not None:
+            usecols = list(columns) if filters is None else list(dict.fromkeys(
+                list(columns) + self._get_filter_columns(filters)))
+            kwargs = {**kwargs, 'usecols': usecols}
+        import pandas as pd
+        import pyarrow
+        with self.backend.open(full_path, 'rb') as file:
+            for data in pd.read_csv(file, chunksize=chunk_size or self.CSV_CHUNK_SIZE, **kwargs):
+                if filters is not None:
+                    data = self._filter_dataframe(data, filters)
+                if columns is not None:
+                    data = data[list(columns)]
+                yield pyarrow.RecordBatch.from_pandas(data, preserve_index=False) if as_arrow else data
+
+    @ contextmanager
+    def _open_parquet_source(self, full_path):
+        import pyarrow.dataset
+        filesystem = self.backend.get_arrow_filesystem()
+        if self.backend.LOCAL_PATH or filesystem is not None:
+            yield pyarrow.dataset.dataset(full_path, format='parquet', filesystem=filesystem)
+            return
+        with self.backend.open(full_path, 'rb') as file:
+            yield pyarrow.dataset.ParquetFileFormat().make_fragment(file)
+
+    def _iter_load_parquet_file(self, full_path, chunk_size=None, columns=None, filters=None, as_arrow=False,
+                                **kwargs):
+        import pyarrow.parquet
+        if filters is not None:
+            filters = pyarrow.parquet.filters_to_expression(filters)
+        with self._open_parquet_source(full_path) as source:
+            for batch in source.to_batches(columns=columns, filter=filters,
+                                           batch_size=chunk_size or self.PARQUET_BATCH_SIZE, **kwargs):
+                yield batch if as_arrow else batch.to_pandas()
+
     def clear_fail_save_list(self):
         self.fail_save_list = []
 
@@ -128,230 +667,392 @@ class FileIO(object):
         self.fail_load_list = []
 
     def get_notifier(self):
+        from notifiers import get_notifier
         self.notifier = get_notifier(self.NOTIFIER, self.project, self.logger)
 
-    '''
-    def save_multiple_files(self, mode, data_list, file_path, file_name_list, file_type, verbose=False, **kwargs):
-        self.clear_fail_save_list()
-        if mode == 'normal':
-            if isinstance(file_path, list):
-                list(map(lambda data, path, file_name: self.save_file(
-                    data, path, file_name, file_type, verbose, **kwargs), data_list, file_path, file_name_list))
-            else:
-                list(map(lambda data, file_name: self.save_file(
-                    data, file_path, file_name, file_type, verbose, **kwargs), data_list, file_name_list))
-        elif mode == 'thread':
-            if isinstance(file_path, list):
-                with ThreadPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    executor.map(lambda data, path, file_name: self.save_file(
-                        data, path, file_name, file_type, verbose, **kwargs), data_list, file_path, file_name_list)
-            else:
-                with ThreadPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    executor.map(lambda data, file_name: self.save_file(
-                        data, file_path, file_name, file_type, verbose, **kwargs), data_list, file_name_list)
-        elif mode == 'process':
-            if isinstance(file_path, list):
-                with ProcessPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    executor.map(lambda data, path, file_name: self.save_file(
-                        data, path, file_name, file_type, verbose, **kwargs), data_list, file_path, file_name_list)
-            else:
-                with ProcessPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    executor.map(lambda data, file_name: self.save_file(
-                        data, file_path, file_name, file_type, verbose, **kwargs), data_list, file_name_list)
-        self.notify_fail_file(True)
-        self.save_fail_save_list()
-
-    def load_multiple_files(self, mode, file_path, file_name_list, file_type, verbose=False, **kwargs):
-        data = []
-        self.clear_fail_load_list()
-        if mode == 'normal':
-            if isinstance(file_path, list):
-                data = list(map(lambda path, file_name: self.load_file(
-                            path, file_name, file_type, verbose, **kwargs), file_path, file_name_list))
-            else:
-                data = list(map(lambda file_name: self.load_file(
-                            file_path, file_name, file_type, verbose, **kwargs), file_name_list))
-        elif mode == 'thread':
-            if isinstance(file_path, list):
-                with ThreadPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    data = list(executor.map(lambda path, file_name: self.load_file(
-                                        path, file_name, file_type, verbose, **kwargs), file_path, file_name_list))
-            else:
-                with ThreadPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    data = list(executor.map(lambda file_name: self.load_file(
-                                        file_path, file_name, file_type, verbose, **kwargs), file_name_list))
-        elif mode == 'process':
-            if isinstance(file_path, list):
-                with ProcessPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    data = list(executor.map(lambda path, file_name: self.load_file(
-                                        path, file_name, file_type, verbose, **kwargs), file_path, file_name_list))
-            else:
-                with ProcessPoolExecutor(max_workers=self.FILEIO_NO_WORKERS) as executor:
-                    data = list(executor.map(lambda file_name: self.load_file(
-                                        file_path, file_name, file_type, verbose, **kwargs), file_name_list))
-        self.notify_fail_file(False)
-        self.save_fail_load_list()
-        return data
-    '''
-
-    def notify_fail_file(self, save):
-        if self.notifier is None:
-            self.get_notifier()
-        if save:
-            operation = 'saved'
-            fail_list_files = [os.path.join(fail['file_path'], fail['file_name']) for fail in self.fail_save_list]
-        else:
-            operation = 'loaded'
-            fail_list_files = [os.path.join(fail['file_path'], fail['file_name']) for fail in self.fail_load_list]
-        fail_list_str = '\n'.join(fail_list_files)
-        if len(fail_list_str) > 0:
-            message = 'The following files were not {} successfully:\n\n'.format(operation) + fail_list_str
-            self.notifier.retry_send_message(message)
+    @ staticmethod
+    def _submit(executor, func, args):
+        try:
+            return executor.submit(func, *args)
+        except Exception as e:
+            future = Future()
+            future.set_exception(e)
+            return future
 
-    def save_fail_save_list(self):
-        if len(self.fail_save_list) > 0:
-            file_name = self.PREFIX_FAIL_SAVE_LIST + '{}.txt'.format(int(time.time()))
-            #self.save_file(self.fail_save_list, Path.TEMP_FOLDER, file_name, 'txt')
+    @ classmethod
+    def _iter_futures_with_backpressure(cls, executor, func, arg_iter, max_in_flight):
+        in_flight = deque()
+        for args in arg_iter:
+            in_flight.append(cls._submit(executor, func, args))
+            if len(in_flight) >= max_in_flight:
+                yield in_flight.popleft()
+        while len(in_flight) > 0:
+            yield in_flight.popleft()
 
-    def save_fail_load_list(self):
-        if len(self.fail_load_list):
-            file_name = self.PREFIX_FAIL_LOAD_LIST + '{}.txt'.format(int(time.time()))
-            #self.save_file(self.fail_load_list, Path.TEMP_FOLDER, file_name, 'txt')
+    @ classmethod
+    def _map_with_backpressure(cls, executor, func, arg_iter, max_in_flight):
+        for future in cls._iter_futures_with_backpressure(executor, func, arg_iter, max_in_flight):
+            yield future.result()
 
-    '''
-    def load_fail_save_list(self, file_name):
-        self.fail_save_list = self.load_file(TEMP_PATH, file_name, 'joblib')
+    @ classmethod
+    def _map_process_with_backpressure(cls, executor, func, arg_iter, max_in_flight):
+        for future in cls._iter_futures_with_backpressure(executor, func, arg_iter, max_in_flight):
+            try:
+                yield future.result()
+            except Exception as e:
+                yield False, str(e), None
 
-    def load_fail_load_list(self, file_name):
-        self.fail_load_list = self.load_file(TEMP_PATH, file_name, 'joblib')
+    def _get_batch_mode(self, mode, file_type):
+        if mode == 'auto':
+            mode = 'process' if file_type in self.PROCESS_FILE_TYPES else 'thread'
+        if mode == 'process' and file_type not in self.PROCESS_FILE_TYPES:
+            self.logger.warning('File type {} cannot be handled in process mode. Fall back to thread mode.'.format(
+                file_type))
+            mode = 'thread'
+        if mode == 'process' and self.backend is not self.BACKEND:
+            self.logger.warning('Custom backend {} cannot be shared with worker processes. Fall back to thread '
+                                'mode.'.format(self.backend.NAME))
+            mode = 'thread'
+        return mode
 
-    def retry_save_multiple_files(self, mode, file_name=None):
-        if file_name is not None:
-            self.load_fail_save_list(file_name)
-        fail_save_list = [(fail['data'], fail['file_path'], fail['file_name'], fail['file_type'], fail['verbose'],
-                           fail['kwargs']) for fail in self.fail_save_list]
-        data_list, file_path, file_name_list, file_type, verbose, kwargs = \
-            ([fail[index] for fail in fail_save_list] for index in range(6))
-        unique_file_path = set(file_path)
-        file_path = list(unique_file_path)[0] if len(unique_file_path) == 1 else file_path
-        file_type = file_type[0]
-        verbose = verbose[0]
-        kwargs = kwargs[0]
-        self.save_multiple_files(mode, data_list, file_path, file_name_list, file_type, verbose, **kwargs)
-
-    def retry_load_multiple_files(self, mode, file_name=None):
-        if file_name is not None:
-            self.load_fail_load_list(file_name)
-        fail_load_list = [(fail['file_path'], fail['file_name'], fail['file_type'], fail['verbose'], fail['kwargs'])
-                          for fail in self.fail_load_list]
-        file_path, file_name_list, file_type, verbose, kwargs = \
-            ([fail[index] for fail in fail_load_list] for index in range(5))
-        unique_file_path = set(file_path)
-        file_path = list(unique_file_path)[0] if len(unique_file_path) == 1 else file_path
-        file_type = file_type[0]
-        verbose = verbose[0]
-        kwargs = kwargs[0]
-        data = self.load_multiple_files(mode, file_path, file_name_list, file_type, verbose, **kwargs)
-        return data
-    '''
+    def _get_batch_max_workers(self, mode, max_workers):
+        if max_workers is not None:
+            return max_workers
+        if mode == 'thread':
+            return self.NO_THREAD_WORKERS
+        return self.NO_PROCESS_WORKERS or 1
 
-    def clear_temp_fail_file(self, save):
-        if save:
-            file_key = self.PREFIX_FAIL_SAVE_LIST
-        else:
-            file_key = self.PREFIX_FAIL_LOAD_LIST
-        fail_file_list = os.listdir(Path.TEMP_FOLDER)
-        fail_file_list = [os.path.join(Path.TEMP_FOLDER, fail_file) for fail_file in fail_file_list
-                          if file_key in fail_file]
-        [os.remove(fail_file) for fail_file in fail_file_list]
+    @ staticmethod
+    def _get_batch_executor(mode, max_workers):
+        if mode == 'thread':
+            return ThreadPoolExecutor(max_workers=max_workers)
+        return ProcessPoolExecutor(max_workers=max_workers)
 
     @ staticmethod
-    def _save_binary_file(data, full_path, encoding='utf-8'):
-        with open(full_path, 'wb', encoding=encoding) as file:
-            file.write(data)
+    def _get_batch_path_iter(file_path, file_name_list):
+        if isinstance(file_path, (list, tuple)):
+            return zip(file_path, file_name_list)
+        return ((file_path, file_name) for file_name in file_name_list)
 
-    def _save_html_file(self, data, full_path, encoding='utf-8'):
-        self._save_txt_file(data, full_path, encoding)
+    def _save_file_in_batch(self, data, file_path, file_name, file_type, count_file, kwargs):
+        return self.save_file(data, file_path, file_name, file_type, count_file, **kwargs)
 
-    def _save_json_file(self, data, full_path, encoding='utf-8'):
-        if not isinstance(data, str):
-            data = json.dumps(data)
-        self._save_txt_file(data, full_path, encoding)
+    def _load_file_in_batch(self, file_path, file_name, file_type, kwargs):
+        return self.load_file(file_path, file_name, file_type, **kwargs)
 
-    @ staticmethod
-    def _save_txt_file(data, full_path, encoding='utf-8'):
-        with open(full_path, 'w', encoding=encoding) as file:
-            file.write(data)
+    def iter_save_multiple_files(self, data_list, file_path, file_name_list, file_type, count_file=False,
+                                 mode='auto', max_workers=None, **kwargs):
+        mode = self._get_batch_mode(mode, file_type)
+        path_iter = self._get_batch_path_iter(file_path, file_name_list)
+        with self.atomic_batch():
+            if mode == 'normal':
+                for data, (path, file_name) in zip(data_list, path_iter):
+                    yield self.save_file(data, path, file_name, file_type, count_file, **kwargs)
+                return
+            max_workers = self._get_batch_max_workers(mode, max_workers)
+            max_in_flight = max_workers * self.BATCH_IN_FLIGHT_FACTOR
+            with self._get_batch_executor(mode, max_workers) as executor:
+                if mode == 'thread':
+                    arg_iter = ((data, path, file_name, file_type, count_file, kwargs)
+                                for data, (path, file_name) in zip(data_list, path_iter))
+                    yield from self._map_with_backpressure(executor, self._save_file_in_batch, arg_iter,
+                                                           max_in_flight)
+                    return
+                batch = deque()
+                arg_iter = self._get_process_save_arg_iter(data_list, path_iter, file_type, kwargs, batch)
+                for success, result, record in self._map_process_with_backpressure(
+                        executor, _process_save_file, arg_iter, max_in_flight):
+                    data, path, file_name = batch.popleft()
+                    self._observe_process_record('save', file_type, record)
+                    yield self._handle_batch_save_result(success, result, data, path, file_name, file_type,
+                                                         count_file, kwargs)
 
-    @ staticmethod
-    def _save_joblib_file(data, full_path, **kwargs):
-        joblib.dump(data, full_path, **kwargs)
+    def _get_process_save_arg_iter(self, data_list, path_iter, file_type, kwargs, batch):
+        write_options = self._get_write_options()
+        for data, (path, file_name) in zip(data_list, path_iter):
+            batch.append((data, path, file_name))
+            self._prepare_atomic_folder(path)
+            yield type(self), data, os.path.join(path, file_name), file_type, kwargs, write_options, io_metrics.enabled
 
-    @ staticmethod
-    def _save_pickle_file(data, full_path, pandas=True, **kwargs):
-        if pandas:
-            data.to_pickle(full_path, **kwargs)
+    def _observe_process_record(self, operation, file_type, record):
+        if record is not None:
+            io_metrics.observe_record('file_io', operation, self.backend.NAME, file_type, record)
+
+    def _handle_batch_save_result(self, success, result, data, file_path, file_name, file_type, count_file,
+                                  kwargs):
+        full_path = os.path.join(file_path, file_name)
+        if success:
+            if result is not None:
+                self._add_pending_atomic_write(result, file_path, file_name)
+            else:
+                self.update_mtime_index(file_path, file_name)
+            self.logger.debug('{} saved.'.format(full_path))
+            if count_file:
+                self.count_file_in_redis(file_path)
         else:
-            with open(full_path, 'wb') as file:
-                pickle.dump(data, file, **kwargs)
+            self.logger.error('Error in saving file {}. {}'.format(full_path, result))
+            self.fail_save_list.append({'data': data, 'file_path': file_path, 'file_name': file_name,
+                                        'file_type': file_type, 'count_file': count_file, 'kwargs': kwargs})
+        return success
 
-    @ staticmethod
-    def _save_csv_file(data, full_path, **kwargs):
-        data.to_csv(full_path, **kwargs)
+    def save_multiple_files(self, data_list, file_path, file_name_list, file_type, count_file=False, mode='auto',
+                            max_workers=None, notify=True, **kwargs):
+        self.clear_fail_save_list()
+        result = list(self.iter_save_multiple_files(data_list, file_path, file_name_list, file_type, count_file,
+                                                    mode, max_workers, **kwargs))
+        if len(self.fail_save_list) > 0:
+            if notify:
+                self.notify_fail_file(True)
+            self.save_fail_save_list()
+        return result
 
-    @ staticmethod
-    def _save_parquet_file(data, full_path, **kwargs):
-        data.to_parquet(full_path, **kwargs)
+    def iter_load_multiple_files(self, file_path, file_name_list, file_type, mode='auto', max_workers=None,
+                                 **kwargs):
+        mode = self._get_batch_mode(mode, file_type)
+        path_iter = self._get_batch_path_iter(file_path, file_name_list)
+        if mode == 'normal':
+            for path, file_name in path_iter:
+                yield self.load_file(path, file_name, file_type, **kwargs)
+            return
+        max_workers = self._get_batch_max_workers(mode, max_workers)
+        max_in_flight = max_workers * self.BATCH_IN_FLIGHT_FACTOR
+        with self._get_batch_executor(mode, max_workers) as executor:
+            if mode == 'thread':
+                arg_iter = ((path, file_name, file_type, kwargs) for path, file_name in path_iter)
+                yield from self._map_with_backpressure(executor, self._load_file_in_batch, arg_iter, max_in_flight)
+                return
+            batch = deque()
+            arg_iter = self._get_process_load_arg_iter(path_iter, file_type, kwargs, batch)
+            for success, data, record in self._map_process_with_backpressure(
+                    executor, _process_load_file, arg_iter, max_in_flight):
+                path, file_name = batch.popleft()
+                self._observe_process_record('load', file_type, record)
+                yield self._handle_batch_load_result(success, data, path, file_name, file_type, kwargs)
 
-    @ staticmethod
-    def _load_binary_file(full_path, encoding='utf-8'):
-        with open(full_path, 'rb', encoding=encoding) as file:
-            data = file.read()
-        return data
+    def _get_process_load_arg_iter(self, path_iter, file_type, kwargs, batch):
+        for path, file_name in path_iter:
+            batch.append((path, file_name))
+            yield type(self), os.path.join(path, file_name), file_type, kwargs, io_metrics.enabled
 
-    def _load_html_file(self, full_path, encoding='utf-8'):
-        data = self._load_txt_file(full_path, encoding)
-        return data
+    def _handle_batch_load_result(self, success, data, file_path, file_name, file_type, kwargs):
+        full_path = os.path.join(file_path, file_name)
+        if success:
+            self.logger.debug('{} loaded'.format(full_path))
+            return data
+        self.logger.error('Error in loading file {}. {}'.format(full_path, data))
+        self.fail_load_list.append({'file_path': file_path, 'file_name': file_name,
+                                    'file_type': file_type, 'kwargs': kwargs})
+        return None
 
-    def _load_json_file(self, full_path, encoding='utf-8'):
-        data = self._load_txt_file(full_path, encoding)
-        data = json.loads(data)
+    def load_multiple_files(self, file_path, file_name_list, file_type, mode='auto', max_workers=None, notify=True,
+                            **kwargs):
+        self.clear_fail_load_list()
+        data = list(self.iter_load_multiple_files(file_path, file_name_list, file_type, mode, max_workers,
+                                                  **kwargs))
+        if len(self.fail_load_list) > 0:
+            if notify:
+                self.notify_fail_file(False)
+            self.save_fail_load_list()
         return data
 
     @ staticmethod
-    def _load_txt_file(full_path, encoding='utf-8', errors='ignore'):
-        with open(full_path, 'r', encoding=encoding, errors=errors) as file:
-            data = file.read()
-        return data
+    async def _run_in_executor(func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(func, *args, **kwargs))
 
     @ staticmethod
-    def _load_joblib_file(full_path, **kwargs):
-        data = joblib.load(full_path, **kwargs)
-        return data
+    async def _async_map_with_backpressure(coro_func, arg_iter, max_in_flight):
+        in_flight = deque()
+        for args in arg_iter:
+            in_flight.append(asyncio.ensure_future(coro_func(*args)))
+            if len(in_flight) >= max_in_flight:
+                yield await in_flight.popleft()
+        while len(in_flight) > 0:
+            yield await in_flight.popleft()
 
-    @ staticmethod
-    def _load_pickle_file(full_path, pandas=True, **kwargs):
-        if pandas:
-            data = pd.read_pickle(full_path, **kwargs)
-        else:
-            with open(full_path, 'rb') as file:
-                data = pickle.load(file, **kwargs)
-        return data
+    async def _async_save(self, data, file_path, file_name, file_type, **kwargs):
+        return await self._run_in_executor(self._save_to_full_path, data, file_path, file_name, file_type,
+                                           **kwargs)
 
-    @ staticmethod
-    def _load_csv_file(full_path, **kwargs):
-        data = pd.read_csv(full_path, **kwargs)
-        return data
+    async def _async_load(self, full_path, file_type, **kwargs):
+        return await self._run_in_executor(self._load_from_backend, full_path, file_type, **kwargs)
 
-    @ staticmethod
-    def _load_parquet_file(full_path, **kwargs):
+    async def async_save_file(self, data, file_path, file_name, file_type, count_file=False, **kwargs):
+        full_path = os.path.join(file_path, file_name)
         try:
-            data = pyarrow.parquet.ParquetDataset(full_path).read().to_pandas()
+            if not await self._async_save(data, file_path, file_name, file_type, **kwargs):
+                return True
+            self.logger.debug('{} saved.'.format(full_path))
+            if count_file:
+                await self._run_in_executor(self.count_file_in_redis, file_path)
+            return True
+        except Exception as e:
+            self.logger.error('Error in saving file {}. {}'.format(full_path, e))
+            self.fail_save_list.append({'data': data, 'file_path': file_path, 'file_name': file_name,
+                                        'file_type': file_type, 'count_file': count_file, 'kwargs': kwargs})
+            return False
+
+    async def async_load_file(self, file_path, file_name, file_type, **kwargs):
+        full_path = os.path.join(file_path, file_name)
+        try:
+            if self.load_cache is not None:
+                data = await self._async_load_with_cache(file_path, file_name, file_type, **kwargs)
+            else:
+                data = await self._async_load(full_path, file_type, **kwargs)
+            self.logger.debug('{} loaded'.format(full_path))
         except Exception as e:
-            data = pd.read_parquet(full_path)
+            data = None
+            self.logger.error('Error in loading file {}. {}'.format(full_path, e))
+            self.fail_load_list.append({'file_path': file_path, 'file_name': file_name,
+                                        'file_type': file_type, 'kwargs': kwargs})
+        return data
+
+    async def async_save_multiple_files(self, data_list, file_path, file_name_list, file_type, count_file=False,
+                                        max_concurrency=None, notify=True, **kwargs):
+        self.clear_fail_save_list()
+        path_iter = self._get_batch_path_iter(file_path, file_name_list)
+        arg_iter = ((data, path, file_name, file_type, count_file)
+                    for data, (path, file_name) in zip(data_list, path_iter))
+        save_func = functools.partial(self.async_save_file, **kwargs)
+        self.atomic_batch_depth += 1
+        try:
+            result = [success async for success in self._async_map_with_backpressure(
+                save_func, arg_iter, max_concurrency or self.ASYNC_MAX_CONCURRENCY)]
+        finally:
+            self.atomic_batch_depth -= 1
+            if self.atomic_batch_depth == 0:
+                await self._run_in_executor(self._end_atomic_batch)
+        if len(self.fail_save_list) > 0:
+            if notify:
+                await self._run_in_executor(self.notify_fail_file, True)
+            await self._run_in_executor(self.save_fail_save_list)
+        return result
+
+    async def async_load_multiple_files(self, file_path, file_name_list, file_type, max_concurrency=None,
+                                        notify=True, **kwargs):
+        self.clear_fail_load_list()
+        arg_iter = ((path, file_name, file_type)
+                    for path, file_name in self._get_batch_path_iter(file_path, file_name_list))
+        load_func = functools.partial(self.async_load_file, **kwargs)
+        data = [file_data async for file_data in self._async_map_with_backpressure(
+            load_func, arg_iter, max_concurrency or self.ASYNC_MAX_CONCURRENCY)]
+        if len(self.fail_load_list) > 0:
+            if notify:
+                await self._run_in_executor(self.notify_fail_file, False)
+            await self._run_in_executor(self.save_fail_load_list)
         return data
 
+    def notify_fail_file(self, save, fail_list=None):
+        if self.notifier is None:
+            self.get_notifier()
+        if fail_list is None:
+            fail_list = self.fail_save_list if save else self.fail_load_list
+        operation = 'saved' if save else 'loaded'
+        fail_list_files = [os.path.join(fail['file_path'], fail['file_name']) for fail in fail_list]
+        fail_list_str = '\n'.join(fail_list_files)
+        if len(fail_list_str) > 0:
+            message = 'The following files were not {} successfully:\n\n'.format(operation) + fail_list_str
+            self.notifier.retry_send_message(message)
+
+    def get_retry_queue(self):
+        if self.retry_queue is None:
+            self.retry_queue = RetryQueue(
+                os.path.join(self.RETRY_QUEUE_FOLDER, self.project, self.backend.NAME), self.logger,
+                self.RETRY_MAX_ATTEMPTS, self.RETRY_BACKOFF, self.RETRY_MAX_BACKOFF)
+        return self.retry_queue
+
     @ staticmethod
-    def _load_excel_file(full_path, **kwargs):
-        data = pd.read_excel(full_path, **kwargs)
+    def _write_retry_payload(data, file_type, kwargs, payload_path):
+        LocalBackend().save(get_codec(file_type), data, payload_path, **kwargs)
+
+    def save_fail_save_list(self):
+        if len(self.fail_save_list) > 0:
+            retry_queue = self.get_retry_queue()
+            entries = []
+            for fail in self.fail_save_list:
+                entry = retry_queue.create_entry('save', fail['file_path'], fail['file_name'], fail['file_type'],
+                                                 with_payload=True, count_file=fail.get('count_file', False))
+                try:
+                    retry_queue.write_payload(entry, functools.partial(
+                        self._write_retry_payload, fail['data'], fail['file_type'], fail['kwargs']))
+                except Exception as e:
+                    self.logger.error('Error in saving retry payload for {}. {}'.format(
+                        os.path.join(fail['file_path'], fail['file_name']), e))
+                    continue
+                entries.append(entry)
+            no_added = retry_queue.add_entries(entries)
+            self.logger.info('{} failed saves added to the retry queue'.format(no_added))
+
+    def save_fail_load_list(self):
+        if len(self.fail_load_list) > 0:
+            retry_queue = self.get_retry_queue()
+            no_added = retry_queue.add_entries([retry_queue.create_entry(
+                'load', fail['file_path'], fail['file_name'], fail['file_type'], fail['kwargs'])
+                for fail in self.fail_load_list])
+            self.logger.info('{} failed loads added to the retry queue'.format(no_added))
+
+    def get_modified_timestamp(self, path, file_name):
+        if not self.backend.LOCAL_PATH:
+            return None
+        try:
+            return os.path.getmtime(os.path.join(path, file_name))
+        except FileNotFoundError:
+            return None
+
+    def _check_retry_superseded(self, entry):
+        modified_time = self.get_modified_timestamp(entry['file_path'], entry['file_name'])
+        return modified_time is not None and modified_time > entry['failed_time']
+
+    def _retry_save_entry(self, entry):
+        full_path = os.path.join(entry['file_path'], entry['file_name'])
+        if self._check_retry_superseded(entry):
+            self.logger.info('{} modified after the failed save. Skip retrying.'.format(full_path))
+            return None
+        content = LocalBackend().load(get_codec('binary'), entry['payload'])
+        if self._save_to_full_path(content, entry['file_path'], entry['file_name'], 'binary') and entry.get(
+                'count_file'):
+            self.count_file_in_redis(entry['file_path'])
+        self.logger.debug('{} saved on retry.'.format(full_path))
+        return None
+
+    def _retry_load_entry(self, entry):
+        full_path = os.path.join(entry['file_path'], entry['file_name'])
+        data = self._load_from_backend(full_path, entry['file_type'], **entry['kwargs'])
+        self.logger.debug('{} loaded on retry.'.format(full_path))
         return data
+
+    def _handle_retry_outcomes(self, save, outcomes, notify):
+        report = {'ok': True, 'retried_files': [], 'failed_files': [], 'dead_files': []}
+        if outcomes is None:
+            self.logger.info('Retry queue is being replayed by another job. Skip retrying.')
+            return report
+        if not save:
+            report['data'] = {}
+        failed_entries = []
+        for entry, success, result in outcomes:
+            full_path = os.path.join(entry['file_path'], entry['file_name'])
+            if success:
+                report['retried_files'].append(full_path)
+                if not save:
+                    report['data'][full_path] = result
+                continue
+            self.logger.error('Error in retrying {}. {}'.format(full_path, result))
+            failed_entries.append(entry)
+            report['dead_files' if entry['dead'] else 'failed_files'].append(full_path)
+        report['ok'] = len(failed_entries) == 0
+        if notify and len(failed_entries) > 0:
+            self.notify_fail_file(save, failed_entries)
+        return report
+
+    def retry_fail_save_list(self, max_workers=None, force=False, notify=True):
+        outcomes = self.get_retry_queue().replay('save', self._retry_save_entry,
+                                                 max_workers or self.NO_THREAD_WORKERS, force)
+        return self._handle_retry_outcomes(True, outcomes, notify)
+
+    def retry_fail_load_list(self, max_workers=None, force=False, notify=True):
+        outcomes = self.get_retry_queue().replay('load', self._retry_load_entry,
+                                                 max_workers or self.NO_THREAD_WORKERS, force)
+        return self._handle_retry_outcomes(False, outcomes, notify)
+
+    def clear_temp_fail_file(self, save):
+        return self.get_retry_queue().clear('save' if save else 'load')
@@ -0,0 +1,262 @@
+import io
+import json
+import pickle
+
+
+def convert_to_arrow_table(data, preserve_index=None):
+    import pyarrow
+    if isinstance(data, pyarrow.Table):
+        return data
+    return pyarrow.Table.from_pandas(data, preserve_index=preserve_index)
+
+
+def convert_from_arrow_table(table, pandas=False, columns=None, offset=0, length=None):
+    if columns is not None:
+        table = table.select(columns)
+    if offset > 0 or length is not None:
+        table = table.slice(offset, length)
+    if pandas:
+        return table.to_pandas(split_blocks=True)
+    return table
+
+
+class FormatCodec(object):
+
+    def dump(self, data, file, **kwargs):
+        raise NotImplementedError('{} does not support saving'.format(type(self).__name__))
+
+    def load(self, file, **kwargs):
+        raise NotImplementedError('{} does not support loading'.format(type(self).__name__))
+
+    def dump_path(self, data, full_path, **kwargs):
+        with open(full_path, 'wb') as file:
+            self.dump(data, file, **kwargs)
+
+    def load_path(self, full_path, **kwargs):
+        with open(full_path, 'rb') as file:
+            return self.load(file, **kwargs)
+
+    def dump_to_bytes(self, data, **kwargs):
+        with io.BytesIO() as buffer:
+            self.dump(data, buffer, **kwargs)
+            return buffer.getvalue()
+
+    def load_from_bytes(self, content, **kwargs):
+        with io.BytesIO(content) as buffer:
+            return self.load(buffer, **kwargs)
+
+
+class BinaryCodec(FormatCodec):
+
+    def dump(self, data, file, encoding='utf-8'):
+        file.write(data)
+
+    def load(self, file, encoding='utf-8'):
+        return file.read()
+
+    def dump_to_bytes(self, data, encoding='utf-8'):
+        return bytes(data)
+
+    def load_from_bytes(self, content, encoding='utf-8'):
+        return content
+
+
+class TextCodec(FormatCodec):
+
+    def dump(self, data, file, encoding='utf-8'):
+        file.write(data.encode(encoding))
+
+    def load(self, file, encoding='utf-8', errors='ignore'):
+        text_file = io.TextIOWrapper(file, encoding=encoding, errors=errors)
+        try:
+            return text_file.read()
+        finally:
+            text_file.detach()
+
+    def dump_path(self, data, full_path, encoding='utf-8'):
+        with open(full_path, 'w', encoding=encoding) as file:
+            file.write(data)
+
+    def load_path(self, full_path, encoding='utf-8', errors='ignore'):
+        with open(full_path, 'r', encoding=encoding, errors=errors) as file:
+            return file.read()
+
+    def dump_to_bytes(self, data, encoding='utf-8'):
+        return data.encode(encoding)
+
+
+class JsonCodec(TextCodec):
+
+    @ staticmethod
+    def _to_text(data):
+        return data if isinstance(data, str) else json.dumps(data)
+
+    def dump(self, data, file, encoding='utf-8'):
+        super().dump(self._to_text(data), file, encoding)
+
+    def load(self, file, encoding='utf-8', errors='ignore'):
+        return json.loads(super().load(file, encoding, errors))
+
+    def dump_path(self, data, full_path, encoding='utf-8'):
+        super().dump_path(self._to_text(data), full_path, encoding)
+
+    def load_path(self, full_path, encoding='utf-8', errors='ignore'):
+        return json.loads(super().load_path(full_path, encoding, errors))
+
+    def dump_to_bytes(self, data, encoding='utf-8'):
+        return super().dump_to_bytes(self._to_text(data), encoding)
+
+
+class JoblibCodec(FormatCodec):
+
+    def dump(self, data, file, **kwargs):
+        import joblib
+        joblib.dump(data, file, **kwargs)
+
+    def load(self, file, **kwargs):
+        import joblib
+        return joblib.load(file, **kwargs)
+
+    def dump_path(self, data, full_path, **kwargs):
+        import joblib
+        joblib.dump(data, full_path, **kwargs)
+
+    def load_path(self, full_path, **kwargs):
+        import joblib
+        return joblib.load(full_path, **kwargs)
+
+
+class PickleCodec(FormatCodec):
+
+    def dump(self, data, file, pandas=True, **kwargs):
+        if pandas:
+            data.to_pickle(file, **kwargs)
+        else:
+            pickle.dump(data, file, **kwargs)
+
+    def load(self, file, pandas=True, **kwargs):
+        if pandas:
+            import pandas as pd
+            return pd.read_pickle(file, **kwargs)
+        return pickle.load(file, **kwargs)
+
+    def dump_path(self, data, full_path, pandas=True, **kwargs):
+        if pandas:
+            data.to_pickle(full_path, **kwargs)
+        else:
+            super().dump_path(data, full_path, pandas=False, **kwargs)
+
+    def load_path(self, full_path, pandas=True, **kwargs):
+        if pandas:
+            import pandas as pd
+            return pd.read_pickle(full_path, **kwargs)
+        return super().load_path(full_path, pandas=False, **kwargs)
+
+
+class PandasCodec(FormatCodec):
+
+    WRITE_METHOD = None
+    READ_FUNCTION = None
+
+    def dump(self, data, file, **kwargs):
+        getattr(data, self.WRITE_METHOD)(file, **kwargs)
+
+    def load(self, file, **kwargs):
+        import pandas as pd
+        return getattr(pd, self.READ_FUNCTION)(file, **kwargs)
+
+    def dump_path(self, data, full_path, **kwargs):
+        self.dump(data, full_path, **kwargs)
+
+    def load_path(self, full_path, **kwargs):
+        return self.load(full_path, **kwargs)
+
+
+class CsvCodec(PandasCodec):
+
+    WRITE_METHOD = 'to_csv'
+    READ_FUNCTION = 'read_csv'
+
+
+class ParquetCodec(PandasCodec):
+
+    WRITE_METHOD = 'to_parquet'
+    READ_FUNCTION = 'read_parquet'
+
+
+class ExcelCodec(PandasCodec):
+
+    WRITE_METHOD = 'to_excel'
+    READ_FUNCTION = 'read_excel'
+
+
+class ArrowCodec(FormatCodec):
+
+    def dump(self, data, file, preserve_index=None, **kwargs):
+        import pyarrow.ipc
+        table = convert_to_arrow_table(data, preserve_index)
+        with pyarrow.ipc.new_file(file, table.schema, **kwargs) as writer:
+            writer.write_table(table)
+
+    def load(self, file, pandas=False, columns=None, offset=0, length=None, memory_map=True):
+        import pyarrow.ipc
+        table = pyarrow.ipc.open_file(pyarrow.py_buffer(file.read())).read_all()
+        return convert_from_arrow_table(table, pandas, columns, offset, length)
+
+    def dump_path(self, data, full_path, preserve_index=None, **kwargs):
+        import pyarrow
+        with pyarrow.OSFile(full_path, 'wb') as sink:
+            self.dump(data, sink, preserve_index, **kwargs)
+
+    def load_path(self, full_path, pandas=False, columns=None, offset=0, length=None, memory_map=True):
+        import pyarrow.ipc
+        source = pyarrow.memory_map(full_path, 'r') if memory_map else pyarrow.OSFile(full_path, 'rb')
+        table = pyarrow.ipc.open_file(source).read_all()
+        return convert_from_arrow_table(table, pandas, columns, offset, length)
+
+
+class FeatherCodec(FormatCodec):
+
+    def dump(self, data, file, preserve_index=None, compression='uncompressed', **kwargs):
+        import pyarrow.feather
+        pyarrow.feather.write_feather(convert_to_arrow_table(data, preserve_index), file, compression=compression,
+                                      **kwargs)
+
+    def load(self, file, pandas=False, columns=None, offset=0, length=None, memory_map=True):
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(file, columns=columns)
+        return convert_from_arrow_table(table, pandas, None, offset, length)
+
+    def dump_path(self, data, full_path, preserve_index=None, compression='uncompressed', **kwargs):
+        self.dump(data, full_path, preserve_index, compression, **kwargs)
+
+    def load_path(self, full_path, pandas=False, columns=None, offset=0, length=None, memory_map=True):
+        import pyarrow.feather
+        table = pyarrow.feather.read_table(full_path, columns=columns, memory_map=memory_map)
+        return convert_from_arrow_table(table, pandas, None, offset, length)
+
+
+CODECS = {}
+
+
+def register_codec(file_type, codec):
+    CODECS[file_type] = codec
+
+
+def get_codec(file_type):
+    if file_type not in CODECS:
+        raise ValueError('No codec registered for file type {}'.format(file_type))
+    return CODECS[file_type]
+
+
+register_codec('binary', BinaryCodec())
+register_codec('txt', TextCodec())
+register_codec('html', TextCodec())
+register_codec('json', JsonCodec())
+register_codec('joblib', JoblibCodec())
+register_codec('pickle', PickleCodec())
+register_codec('csv', CsvCodec())
+register_codec('parquet', ParquetCodec())
+register_codec('arrow', ArrowCodec())
+register_codec('feather', FeatherCodec())
+register_codec('excel', ExcelCodec())
@@ -0,0 +1,216 @@
+import json
+import time
+import bisect
+import threading
+
+
+class Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+
+    def get_cumulative_counts(self):
+        cumulative_counts = []
+        no_observations = 0
+        for count in self.counts:
+            no_observations += count
+            cumulative_counts.append(no_observations)
+        return cumulative_counts
+
+    def to_dict(self):
+        bounds = [str(bound) for bound in self.buckets] + ['+Inf']
+        return {'count': self.count, 'sum': self.total,
+                'buckets': dict(zip(bounds, self.get_cumulative_counts()))}
+
+
+class NullMeasurement(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        return False
+
+    def add_bytes(self, no_bytes):
+        pass
+
+    def add_serialise_time(self, seconds):
+        pass
+
+    def add_io_time(self, seconds):
+        pass
+
+    def set_status(self, status):
+        pass
+
+
+class IOMeasurement(object):
+
+    def __init__(self, metrics, labels, thread_bound=True):
+        self.metrics = metrics
+        self.labels = labels
+        self.thread_bound = thread_bound
+        self.no_bytes = None
+        self.serialise_seconds = None
+        self.io_seconds = None
+        self.status = 'ok'
+        self.total_seconds = None
+        self.start_time = None
+        self.start_cpu_time = None
+        self.previous = None
+
+    def __enter__(self):
+        if self.thread_bound:
+            self.previous = self.metrics.get_current()
+            self.metrics.local.measurement = self
+            self.start_cpu_time = time.thread_time()
+        self.start_time = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        total_seconds = time.perf_counter() - self.start_time
+        self.total_seconds = total_seconds
+        if self.thread_bound:
+            cpu_seconds = time.thread_time() - self.start_cpu_time
+            self.metrics.local.measurement = self.previous
+            if self.serialise_seconds is None and self.io_seconds is None:
+                self.serialise_seconds = min(cpu_seconds, total_seconds)
+                self.io_seconds = total_seconds - self.serialise_seconds
+        if exc_type is not None:
+            self.status = 'error'
+        self.metrics.observe(self.labels, self.status, total_seconds, self.serialise_seconds, self.io_seconds,
+                             self.no_bytes)
+        return False
+
+    def add_bytes(self, no_bytes):
+        self.no_bytes = (self.no_bytes or 0) + no_bytes
+
+    def add_serialise_time(self, seconds):
+        self.serialise_seconds = (self.serialise_seconds or 0) + seconds
+
+    def add_io_time(self, seconds):
+        self.io_seconds = (self.io_seconds or 0) + seconds
+
+    def set_status(self, status):
+        self.status = status
+
+    def get_record(self):
+        return self.status, self.total_seconds, self.serialise_seconds, self.io_seconds, self.no_bytes
+
+
+class IOMetrics(object):
+
+    METRIC_PREFIX = 'sctys_io'
+    LABEL_NAMES = ['component', 'operation', 'backend', 'file_type', 'status']
+    PHASES = ['total', 'serialise', 'io']
+    SECONDS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300]
+    BYTES_BUCKETS = [2 ** power for power in range(10, 34, 2)]
+    NULL_MEASUREMENT = NullMeasurement()
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.series = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def measure(self, component, operation, backend=None, file_type=None):
+        if not self.enabled:
+            return self.NULL_MEASUREMENT
+        return IOMeasurement(self, (component, operation, backend or '', file_type or ''))
+
+    def measure_async(self, component, operation, backend=None, file_type=None):
+        if not self.enabled:
+            return self.NULL_MEASUREMENT
+        return IOMeasurement(self, (component, operation, backend or '', file_type or ''), thread_bound=False)
+
+    def get_current(self):
+        return getattr(self.local, 'measurement', None)
+
+    def add_bytes(self, no_bytes):
+        measurement = self.get_current()
+        if measurement is not None:
+            measurement.add_bytes(no_bytes)
+
+    def _get_series(self, key):
+        series = self.series.get(key)
+        if series is None:
+            series = {'seconds': {phase: Histogram(self.SECONDS_BUCKETS) for phase in self.PHASES},
+                      'bytes': Histogram(self.BYTES_BUCKETS)}
+            self.series[key] = series
+        return series
+
+    def observe(self, labels, status, total_seconds, serialise_seconds=None, io_seconds=None, no_bytes=None):
+        with self.lock:
+            series = self._get_series(labels + (status,))
+            series['seconds']['total'].observe(total_seconds)
+            if serialise_seconds is not None:
+                series['seconds']['serialise'].observe(serialise_seconds)
+            if io_seconds is not None:
+                series['seconds']['io'].observe(io_seconds)
+            if no_bytes is not None:
+                series['bytes'].observe(no_bytes)
+
+    def observe_record(self, component, operation, backend, file_type, record):
+        self.observe((component, operation, backend or '', file_type or ''), *record)
+
+    def reset(self):
+        with self.lock:
+            self.series = {}
+
+    def to_dict(self):
+        with self.lock:
+            result = []
+            for key, series in self.series.items():
+                total_seconds = series['seconds']['total'].total
+                result.append({**dict(zip(self.LABEL_NAMES, key)), 'count': series['seconds']['total'].count,
+                               'seconds': {phase: histogram.to_dict()
+                                           for phase, histogram in series['seconds'].items()},
+                               'bytes': series['bytes'].to_dict(),
+                               'bytes_per_second': series['bytes'].total / total_seconds if total_seconds > 0 else 0})
+        return result
+
+    def export_json(self):
+        return json.dumps(self.to_dict())
+
+    @ staticmethod
+    def _format_labels(labels):
+        return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                        for name, value in labels)
+
+    def _format_histogram(self, name, labels, histogram):
+        lines = []
+        bounds = [str(bound) for bound in histogram.buckets] + ['+Inf']
+        for bound, count in zip(bounds, histogram.get_cumulative_counts()):
+            lines.append('{}_bucket{{{}}} {}'.format(name, self._format_labels(labels + [('le', bound)]), count))
+        lines.append('{}_sum{{{}}} {}'.format(name, self._format_labels(labels), histogram.total))
+        lines.append('{}_count{{{}}} {}'.format(name, self._format_labels(labels), histogram.count))
+        return lines
+
+    def export_prometheus(self):
+        seconds_name = '{}_seconds'.format(self.METRIC_PREFIX)
+        bytes_name = '{}_bytes'.format(self.METRIC_PREFIX)
+        seconds_lines = ['# HELP {} Time spent in I/O operations by phase.'.format(seconds_name),
+                         '# TYPE {} histogram'.format(seconds_name)]
+        bytes_lines = ['# HELP {} Bytes transferred by I/O operations.'.format(bytes_name),
+                       '# TYPE {} histogram'.format(bytes_name)]
+        with self.lock:
+            for key, series in self.series.items():
+                labels = list(zip(self.LABEL_NAMES, key))
+                for phase, histogram in series['seconds'].items():
+                    if histogram.count > 0:
+                        seconds_lines.extend(self._format_histogram(seconds_name, labels + [('phase', phase)],
+                                                                    histogram))
+                if series['bytes'].count > 0:
+                    bytes_lines.extend(self._format_histogram(bytes_name, labels, series['bytes']))
+        return '\n'.join(seconds_lines + bytes_lines) + '\n'
+
+
+io_metrics = IOMetrics()
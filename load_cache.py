@@ -0,0 +1,129 @@
+import sys
+import copy
+import threading
+from collections import OrderedDict
+
+
+class LoadCache(object):
+
+    IMMUTABLE_TYPES = (str, bytes, int, float, bool, complex, type(None), frozenset)
+
+    def __init__(self, max_bytes=512 * 2 ** 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.no_bytes = 0
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'bytes_saved': 0}
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats['entries'] = len(self.entries)
+            stats['bytes'] = self.no_bytes
+        no_requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / no_requests if no_requests > 0 else 0
+        return stats
+
+    @ staticmethod
+    def get_cache_key(full_path, file_type, kwargs):
+        return full_path, file_type, repr(sorted(kwargs.items()))
+
+    @ staticmethod
+    def _is_instance(data, module_name, type_names):
+        module = sys.modules.get(module_name)
+        return module is not None and isinstance(data, tuple(getattr(module, name) for name in type_names))
+
+    @ classmethod
+    def estimate_size(cls, data, file_size):
+        if cls._is_instance(data, 'pandas', ['DataFrame']):
+            return int(data.memory_usage(deep=True).sum())
+        if cls._is_instance(data, 'pandas', ['Series']):
+            return int(data.memory_usage(deep=True))
+        if cls._is_instance(data, 'pyarrow', ['Table', 'RecordBatch']) or cls._is_instance(
+                data, 'numpy', ['ndarray']):
+            return data.nbytes
+        if isinstance(data, (str, bytes)):
+            return sys.getsizeof(data)
+        return file_size
+
+    @ classmethod
+    def _freeze(cls, data):
+        if cls._is_instance(data, 'numpy', ['ndarray']):
+            data = data.view()
+            data.flags.writeable = False
+        return data
+
+    @ staticmethod
+    def _check_pandas_copy_on_write():
+        pandas = sys.modules['pandas']
+        if int(pandas.__version__.split('.')[0]) >= 3:
+            return True
+        return pandas.options.mode.copy_on_write is True
+
+    @ classmethod
+    def get_view(cls, data):
+        if isinstance(data, cls.IMMUTABLE_TYPES) or cls._is_instance(data, 'pyarrow', ['Table', 'RecordBatch']):
+            return data
+        if cls._is_instance(data, 'pandas', ['DataFrame', 'Series']):
+            return data.copy(deep=not cls._check_pandas_copy_on_write())
+        if cls._is_instance(data, 'numpy', ['ndarray']):
+            return data.view()
+        return copy.deepcopy(data)
+
+    def get(self, key, stamp):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != stamp:
+                if entry is not None:
+                    self._remove(key)
+                    self.stats['stale'] += 1
+                self.stats['misses'] += 1
+                return False, None
+            self.entries.move_to_end(key)
+            self.stats['hits'] += 1
+            self.stats['bytes_saved'] += entry[2]
+        return True, self.get_view(entry[1])
+
+    def _remove(self, key):
+        _, _, size = self.entries.pop(key)
+        self.no_bytes -= size
+
+    def put(self, key, stamp, data, file_size=0):
+        if stamp is None:
+            return data
+        size = self.estimate_size(data, file_size)
+        if size > self.max_bytes:
+            return data
+        data = self._freeze(data)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (stamp, data, size)
+            self.no_bytes += size
+            self._evict()
+        return self.get_view(data)
+
+    def _evict(self):
+        while self.no_bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.stats['evictions'] += 1
+
+    def resize(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def invalidate(self, full_path):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == full_path]:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries = OrderedDict()
+            self.no_bytes = 0
@@ -1,15 +1,148 @@
+import os
 import pymongo
+import bson
 import json
+import logging
+import threading
+from redis_counter import RedisCounter
+from io_metrics import io_metrics
+
+
+class MongoClientRegistry(object):
+
+    clients = {}
+    lock = threading.Lock()
+    pid = os.getpid()
+
+    @ classmethod
+    def reset_after_fork(cls):
+        cls.clients = {}
+        cls.lock = threading.Lock()
+        cls.pid = os.getpid()
+
+    @ staticmethod
+    def get_client_key(db_url, client_class, client_kwargs):
+        return db_url, client_class, repr(sorted(client_kwargs.items()))
+
+    @ classmethod
+    def get_client(cls, db_url, client_class=pymongo.MongoClient, **client_kwargs):
+        if os.getpid() != cls.pid:
+            cls.reset_after_fork()
+        client_key = cls.get_client_key(db_url, client_class, client_kwargs)
+        with cls.lock:
+            if client_key not in cls.clients:
+                cls.clients[client_key] = client_class(db_url, **client_kwargs)
+            return cls.clients[client_key]
+
+    @ classmethod
+    def close_client(cls, db_url, client_class=pymongo.MongoClient, **client_kwargs):
+        with cls.lock:
+            client = cls.clients.pop(cls.get_client_key(db_url, client_class, client_kwargs), None)
+        if client is not None:
+            client.close()
+
+    @ classmethod
+    def close_all_clients(cls):
+        with cls.lock:
+            clients = list(cls.clients.values())
+            cls.clients = {}
+        for client in clients:
+            client.close()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=MongoClientRegistry.reset_after_fork)
+
+
+class MongoDBBufferedWriter(object):
+
+    def __init__(self, mongodb_io, collection, count_file=True, max_documents=1000, max_bytes=None,
+                 max_interval=5):
+        self.mongodb_io = mongodb_io
+        self.collection = collection
+        self.count_file = count_file
+        self.max_documents = max_documents
+        self.max_bytes = max_bytes
+        self.max_interval = max_interval
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+        if self.max_interval:
+            self.flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self.flush_thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, traceback):
+        self.close()
+
+    def _flush_periodically(self):
+        while not self.stop_event.wait(self.max_interval):
+            self.flush()
+
+    def insert(self, document):
+        with self.lock:
+            self.buffer.append(document)
+            if self.max_bytes:
+                self.buffer_bytes += len(bson.encode(document))
+            if (self.max_documents and len(self.buffer) >= self.max_documents) or (
+                    self.max_bytes and self.buffer_bytes >= self.max_bytes):
+                self._flush()
+
+    def _flush(self):
+        if len(self.buffer) == 0:
+            return
+        documents = self.buffer
+        self.buffer = []
+        self.buffer_bytes = 0
+        self.mongodb_io.insert_documents(self.collection, documents, self.count_file)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        self.stop_event.set()
+        if self.flush_thread is not None:
+            self.flush_thread.join()
+        self.flush()
+
 
 class MongoDBIO(object):
 
     DB_URL = "mongodb://localhost:27017/"
+    MONGO_CLIENT_CLASS = pymongo.MongoClient
+    MAX_POOL_SIZE = 100
+    MIN_POOL_SIZE = 0
+    USE_SHARED_CLIENT = True
+    PAGE_SIZE = 10000
+    REDIS_HOST = 'localhost'
+    REDIS_PORT = 6379
+    REDIS_DB = 0
+    REDIS_FLUSH_INTERVAL = 5
+    REDIS_FLUSH_THRESHOLD = 1000
+    INDEX_SPECS = {}
+    INDEX_OPTIONS = ['unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression']
+    BOOLEAN_INDEX_OPTIONS = ['unique', 'sparse']
+    BUFFER_MAX_DOCUMENTS = 1000
+    BUFFER_MAX_BYTES = None
+    BUFFER_MAX_INTERVAL = 5
 
-    def __init__(self, project, logger):
+    def __init__(self, project, logger, db_url=None, client_class=None, **client_kwargs):
         self.project = project
         self.logger = logger
         self.redis = None
+        self.redis_counter = None
         self.client = None
+        self.fail_insert_list = []
+        self.index_cache = {}
+        self.index_specs = {}
+        self.db_url = db_url or self.DB_URL
+        self.client_class = client_class or self.MONGO_CLIENT_CLASS
+        self.client_kwargs = {'maxPoolSize': self.MAX_POOL_SIZE, 'minPoolSize': self.MIN_POOL_SIZE, **client_kwargs}
     
     def __enter__(self):
         self.create_db_connection()
@@ -21,16 +154,24 @@ class MongoDBIO(object):
     def create_db_connection(self):
         if self.client is None:
             try:
-                self.client = pymongo.MongoClient(self.DB_URL)
+                if self.USE_SHARED_CLIENT:
+                    self.client = MongoClientRegistry.get_client(self.db_url, self.client_class, **self.client_kwargs)
+                else:
+                    self.client = self.client_class(self.db_url, **self.client_kwargs)
                 self.logger.debug('Connected to MongoDB server')
             except Exception as e:
                 self.logger.error('Error in connecting to MongoDB server. {}'.format(e))
                 raise
     
-    def close_connection(self):
+    def close_connection(self, force=False):
         if self.client is not None:
-            self.logger.debug('Closing MongoDB connection')
-            self.client.close()
+            if not self.USE_SHARED_CLIENT:
+                self.logger.debug('Closing MongoDB connection')
+                self.client.close()
+            elif force:
+                self.logger.debug('Closing shared MongoDB connection')
+                MongoClientRegistry.close_client(self.db_url, self.client_class, **self.client_kwargs)
+            self.client = None
     
     def obtain_database(self):
         if self.client is None:
@@ -41,42 +182,255 @@ class MongoDBIO(object):
     def obtain_collection(self, db, collection_name):
         collection = db[collection_name]
         return collection
+
+    def set_index_specs(self, collection_name, index_specs):
+        self.index_specs[collection_name] = index_specs
+
+    def _check_index_options_match(self, index_options, index_info):
+        for option in self.INDEX_OPTIONS:
+            spec_value, existing_value = index_options.get(option), index_info.get(option)
+            if option in self.BOOLEAN_INDEX_OPTIONS:
+                spec_value, existing_value = bool(spec_value), bool(existing_value)
+            if spec_value != existing_value:
+                return False
+        return True
+
+    def reconcile_collection_indexes(self, collection, index_specs, rebuild_conflicting=False):
+        index_models = []
+        for index_spec in index_specs:
+            index_keys = self.normalise_index_keys(index_spec['keys'])
+            index_options = {option: value for option, value in index_spec.items() if option != 'keys'}
+            index_name, index_info = self.find_index_by_keys(collection, index_keys)
+            if index_name is not None and self._check_index_options_match(index_options, index_info):
+                continue
+            if index_name is not None:
+                if not rebuild_conflicting:
+                    self.logger.warning('Index {} in collection {} differs from its spec {}. Not rebuilt.'.format(
+                        index_name, collection.full_name, index_spec))
+                    continue
+                self.logger.info('Dropping index {} in collection {} to rebuild it'.format(
+                    index_name, collection.full_name))
+                collection.drop_index(index_name)
+            index_models.append(pymongo.IndexModel(index_keys, **index_options))
+        if len(index_models) > 0:
+            created_index = collection.create_indexes(index_models)
+            self.logger.info('Created indexes {} in collection {}'.format(created_index, collection.full_name))
+            self.clear_index_cache(collection)
+        return collection
+
+    def reconcile_indexes(self, db=None, index_specs=None, rebuild_conflicting=False):
+        if db is None:
+            db = self.obtain_database()
+        if index_specs is None:
+            index_specs = {**self.INDEX_SPECS, **self.index_specs}
+        for collection_name, collection_index_specs in index_specs.items():
+            collection = self.obtain_collection(db, collection_name)
+            self.reconcile_collection_indexes(collection, collection_index_specs, rebuild_conflicting)
     
-    def count_file_in_redis(self, collection_name):
+    def init_redis(self):
         if self.redis is None:
+            import redis
+            self.redis = redis.Redis(host=self.REDIS_HOST, port=self.REDIS_PORT, db=self.REDIS_DB)
+
+    def get_redis_counter(self):
+        if self.redis_counter is None:
             self.init_redis()
-        self.redis.incr(collection_name)
+            self.redis_counter = RedisCounter.get_shared_counter(
+                self.redis, self.logger, self.REDIS_FLUSH_INTERVAL, self.REDIS_FLUSH_THRESHOLD)
+        return self.redis_counter
+
+    def count_file_in_redis(self, collection_name, count=1):
+        self.get_redis_counter().incr(collection_name, count)
+
+    def get_file_count_in_redis(self, collection_name):
+        return self.get_redis_counter().get_count(collection_name)
+
+    def flush_file_count_in_redis(self):
+        if self.redis_counter is not None:
+            self.redis_counter.flush()
     
+    @ staticmethod
+    def measure_io(operation, collection):
+        return io_metrics.measure('mongodb', operation, 'mongodb', collection.name)
+
     def insert_document(self, collection, document, keys, count_file=True):
-        collection.insert_one(document)
-        document_key = json.dumps({key: document[key] for key in keys})
-        self.logger.debug('Document for {} inserted to {}'.format(document_key, collection.full_name))
+        with self.measure_io('insert', collection):
+            collection.insert_one(document)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            document_key = json.dumps({key: document[key] for key in keys}, default=str)
+            self.logger.debug('Document for {} inserted to {}'.format(document_key, collection.full_name))
         if count_file:
             self.count_file_in_redis(collection.name)
+
+    def insert_documents(self, collection, documents, count_file=True):
+        try:
+            with self.measure_io('insert_many', collection):
+                no_inserted = len(collection.insert_many(documents, ordered=False).inserted_ids)
+        except pymongo.errors.BulkWriteError as e:
+            no_inserted = e.details['nInserted']
+            self.logger.error('{} of {} documents failed to insert to {}. {}'.format(
+                len(documents) - no_inserted, len(documents), collection.full_name, e.details['writeErrors'][:5]))
+            self.fail_insert_list.extend({'collection': collection.name, 'document': documents[error['index']]}
+                                         for error in e.details['writeErrors'])
+        except Exception as e:
+            no_inserted = 0
+            self.logger.error('Error in inserting {} documents to {}. {}'.format(
+                len(documents), collection.full_name, e))
+            self.fail_insert_list.extend({'collection': collection.name, 'document': document}
+                                         for document in documents)
+        self.logger.debug('{} documents inserted to {}'.format(no_inserted, collection.full_name))
+        if count_file and no_inserted > 0:
+            self.count_file_in_redis(collection.name, no_inserted)
+        return no_inserted
+
+    def get_buffered_writer(self, collection, count_file=True, max_documents=None, max_bytes=None,
+                            max_interval=None):
+        return MongoDBBufferedWriter(
+            self, collection, count_file, self.BUFFER_MAX_DOCUMENTS if max_documents is None else max_documents,
+            self.BUFFER_MAX_BYTES if max_bytes is None else max_bytes,
+            self.BUFFER_MAX_INTERVAL if max_interval is None else max_interval)
     
-    def find_documents(self, collection, query, return_keys=None):
+    def clear_fail_insert_list(self):
+        self.fail_insert_list = []
+
+    @ staticmethod
+    def get_projection(return_keys=None):
         projection = {"_id": 0}
         if return_keys is not None:
             if isinstance(return_keys, str):
                 return_keys = [return_keys]
             projection = {**projection, **{key: 1 for key in return_keys}}
+        return projection
+
+    def find_documents(self, collection, query, return_keys=None, batch_size=None):
+        projection = self.get_projection(return_keys)
         documents = collection.find(query, projection)
+        if batch_size is not None:
+            documents = documents.batch_size(batch_size)
         return documents
+
+    @ staticmethod
+    def _get_page_cursor_query(page_key, last_document):
+        last_id = last_document['_id']
+        if page_key == '_id':
+            return {'_id': {'$gt': last_id}}
+        last_value = last_document.get(page_key)
+        if last_value is None:
+            return {'$or': [{page_key: {'$ne': None}}, {page_key: None, '_id': {'$gt': last_id}}]}
+        return {'$or': [{page_key: {'$gt': last_value}}, {page_key: last_value, '_id': {'$gt': last_id}}]}
+
+    def iter_document_pages(self, collection, query, return_keys=None, page_key='_id', page_size=None):
+        page_size = page_size or self.PAGE_SIZE
+        if isinstance(return_keys, str):
+            return_keys = [return_keys]
+        if return_keys is None:
+            projection = None
+            drop_keys = ['_id']
+        else:
+            projection = {**self.get_projection(return_keys), '_id': 1, page_key: 1}
+            drop_keys = [key for key in sorted({'_id', page_key}) if key not in return_keys]
+        sort_keys = [('_id', pymongo.ASCENDING)]
+        if page_key != '_id':
+            sort_keys.insert(0, (page_key, pymongo.ASCENDING))
+        last_document = None
+        while True:
+            page_query = query if last_document is None else {
+                '$and': [query, self._get_page_cursor_query(page_key, last_document)]}
+            with self.measure_io('find', collection):
+                page = list(collection.find(page_query, projection).sort(sort_keys).limit(page_size).batch_size(
+                    page_size))
+            if len(page) == 0:
+                return
+            last_document = {'_id': page[-1]['_id'], page_key: page[-1].get(page_key)}
+            for document in page:
+                for key in drop_keys:
+                    document.pop(key, None)
+            yield page
+            if len(page) < page_size:
+                return
+
+    def iter_documents(self, collection, query, return_keys=None, page_key='_id', page_size=None):
+        for page in self.iter_document_pages(collection, query, return_keys, page_key, page_size):
+            yield from page
+
+    def iter_dataframe_pages(self, collection, query, return_keys=None, page_key='_id', page_size=None):
+        import pandas as pd
+        for page in self.iter_document_pages(collection, query, return_keys, page_key, page_size):
+            yield pd.DataFrame.from_records(page)
+
+    def iter_arrow_pages(self, collection, query, return_keys=None, page_key='_id', page_size=None):
+        import pyarrow
+        for page in self.iter_document_pages(collection, query, return_keys, page_key, page_size):
+            yield pyarrow.Table.from_pylist(page)
+
+    def find_documents_as_dataframe(self, collection, query, return_keys=None, page_key='_id', page_size=None):
+        import pandas as pd
+        data_list = list(self.iter_dataframe_pages(collection, query, return_keys, page_key, page_size))
+        if len(data_list) == 0:
+            return pd.DataFrame()
+        return pd.concat(data_list, ignore_index=True)
+
+    def find_documents_as_arrow(self, collection, query, return_keys=None, page_key='_id', page_size=None,
+                                schema=None, use_pymongoarrow=True):
+        if use_pymongoarrow:
+            try:
+                from pymongoarrow.api import find_arrow_all
+                return find_arrow_all(collection, query, schema=schema, projection=self.get_projection(return_keys))
+            except ImportError:
+                self.logger.debug('pymongoarrow not installed. Build arrow table from document pages')
+        import pyarrow
+        table_list = list(self.iter_arrow_pages(collection, query, return_keys, page_key, page_size))
+        if len(table_list) == 0:
+            return pyarrow.table({})
+        return pyarrow.concat_tables(table_list, promote_options='default')
     
     def count_documents(self, collection, query):
-        count = collection.count_documents(query)
+        with self.measure_io('count', collection):
+            count = collection.count_documents(query)
         return count
     
-    def get_collection_index(self, collection):
-        return list(collection.index_information().keys())
-    
-    def check_index_exist(self, collection, index):
-        existing_index = self.get_collection_index(collection)
-        return index in existing_index
-    
-    def create_index(self, collection, index, ascending=True, unique=False):
-        if not self.check_index_exist(collection, index):
+    def get_index_information(self, collection, refresh=False):
+        if refresh or collection.full_name not in self.index_cache:
+            self.index_cache[collection.full_name] = collection.index_information()
+        return self.index_cache[collection.full_name]
+
+    def clear_index_cache(self, collection=None):
+        if collection is None:
+            self.index_cache = {}
+        else:
+            self.index_cache.pop(collection.full_name, None)
+
+    def get_collection_index(self, collection, refresh=False):
+        return list(self.get_index_information(collection, refresh).keys())
+
+    @ staticmethod
+    def normalise_index_keys(index, ascending=True):
+        sort_order = pymongo.ASCENDING if ascending else pymongo.DESCENDING
+        if isinstance(index, str):
+            return [(index, sort_order)]
+        return [(key, sort_order) if isinstance(key, str) else (key[0], key[1]) for key in index]
+
+    @ staticmethod
+    def _normalise_index_direction(direction):
+        return int(direction) if isinstance(direction, (int, float)) else direction
+
+    def find_index_by_keys(self, collection, index_keys, refresh=False):
+        index_keys = [(key, self._normalise_index_direction(direction)) for key, direction in index_keys]
+        for index_name, index_info in self.get_index_information(collection, refresh).items():
+            existing_keys = [(key, self._normalise_index_direction(direction)) for key, direction in index_info['key']]
+            if existing_keys == index_keys:
+                return index_name, index_info
+        return None, None
+
+    def check_index_exist(self, collection, index, ascending=True):
+        if isinstance(index, str) and index in self.get_collection_index(collection):
+            return True
+        index_name, _ = self.find_index_by_keys(collection, self.normalise_index_keys(index, ascending))
+        return index_name is not None
+
+    def create_index(self, collection, index, ascending=True, unique=False, **index_options):
+        if not self.check_index_exist(collection, index, ascending):
             self.logger.debug("Index {} not exist in collection {}. Creating index {}".format(index, collection.full_name, index))
-            sort_order = pymongo.ASCENDING if ascending else pymongo.DESCENDING
-            collection.create_index([(index, sort_order)], unique=unique)
+            collection.create_index(self.normalise_index_keys(index, ascending), unique=unique, **index_options)
+            self.clear_index_cache(collection)
         return collection
\ No newline at end of file
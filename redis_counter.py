@@ -0,0 +1,116 @@
+import os
+import atexit
+import threading
+from collections import Counter
+
+
+class RedisCounter(object):
+
+    counters = {}
+    registry_lock = threading.Lock()
+
+    def __init__(self, redis_client, logger, flush_interval=5, flush_threshold=1000):
+        self.redis = redis_client
+        self.logger = logger
+        self.flush_interval = flush_interval
+        self.flush_threshold = flush_threshold
+        self._reset_state()
+
+    def _reset_state(self):
+        self.pid = os.getpid()
+        self.pending = Counter()
+        self.no_pending = 0
+        self.flushing = Counter()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.flush_thread = None
+
+    @ staticmethod
+    def get_counter_key(redis_client):
+        return repr(sorted(redis_client.connection_pool.connection_kwargs.items()))
+
+    @ classmethod
+    def get_shared_counter(cls, redis_client, logger, flush_interval=5, flush_threshold=1000):
+        counter_key = cls.get_counter_key(redis_client)
+        with cls.registry_lock:
+            if counter_key not in cls.counters:
+                cls.counters[counter_key] = cls(redis_client, logger, flush_interval, flush_threshold)
+            return cls.counters[counter_key]
+
+    @ classmethod
+    def flush_all_counters(cls):
+        with cls.registry_lock:
+            counters = list(cls.counters.values())
+        for counter in counters:
+            counter.close()
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            self._reset_state()
+
+    def _start_flush_thread(self):
+        if self.flush_thread is None and self.flush_interval is not None:
+            self.flush_thread = threading.Thread(target=self._flush_periodically, daemon=True)
+            self.flush_thread.start()
+
+    def _flush_periodically(self):
+        while not self.stop_event.wait(self.flush_interval):
+            self.flush()
+
+    def incr(self, key, count=1):
+        self._check_fork()
+        with self.lock:
+            self.pending[key] += count
+            self.no_pending += count
+            self._start_flush_thread()
+            flush_now = self.no_pending >= self.flush_threshold
+        if flush_now:
+            self.flush()
+
+    def flush(self):
+        self._check_fork()
+        with self.flush_lock:
+            with self.lock:
+                self.flushing = self.pending
+                self.pending = Counter()
+                self.no_pending = 0
+            if len(self.flushing) == 0:
+                return
+            try:
+                pipeline = self.redis.pipeline(transaction=False)
+                for key, count in self.flushing.items():
+                    pipeline.incrby(key, count)
+                pipeline.execute()
+            except Exception as e:
+                self.logger.error('Error in flushing {} counters to redis. {}'.format(len(self.flushing), e))
+                with self.lock:
+                    self.pending.update(self.flushing)
+                    self.no_pending += sum(self.flushing.values())
+            with self.lock:
+                self.flushing = Counter()
+
+    def _get_unflushed_count(self):
+        with self.lock:
+            return self.pending + self.flushing
+
+    def get_count(self, key):
+        self._check_fork()
+        unflushed = self._get_unflushed_count()
+        return int(self.redis.get(key) or 0) + unflushed.get(key, 0)
+
+    def get_counts(self, keys):
+        self._check_fork()
+        unflushed = self._get_unflushed_count()
+        return {key: int(count or 0) + unflushed.get(key, 0) for key, count in zip(keys, self.redis.mget(keys))}
+
+    def close(self):
+        self.stop_event.set()
+        if self.flush_thread is not None and self.flush_thread.is_alive():
+            self.flush_thread.join()
+        self.flush_thread = None
+        self.stop_event = threading.Event()
+        self.flush()
+
+
+atexit.register(RedisCounter.flush_all_counters)
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import functools
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RetryQueue(object):
+
+    JOURNAL_FILE_NAME = 'journal.jsonl'
+    JOURNAL_LOCK_FILE_NAME = 'journal.lock'
+    REPLAY_LOCK_FILE_NAME = 'replay.lock'
+    PAYLOAD_FOLDER_NAME = 'payloads'
+    TEMP_PAYLOAD_PREFIX = '.tmp-'
+    COMPACT_MIN_RECORDS = 1000
+    STALE_PAYLOAD_SECONDS = 3600
+
+    def __init__(self, queue_folder, logger, max_attempts=5, backoff=60, max_backoff=3600):
+        self.queue_folder = queue_folder
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.journal_path = os.path.join(queue_folder, self.JOURNAL_FILE_NAME)
+        self.payload_folder = os.path.join(queue_folder, self.PAYLOAD_FOLDER_NAME)
+        self.lock = threading.Lock()
+
+    @ staticmethod
+    def get_entry_id(kind, full_path):
+        return hashlib.sha1('{}:{}'.format(kind, full_path).encode('utf-8')).hexdigest()
+
+    def get_backoff(self, attempts):
+        return min(self.backoff * 2 ** (attempts - 1), self.max_backoff)
+
+    def create_entry(self, kind, file_path, file_name, file_type, kwargs=None, with_payload=False, count_file=False):
+        token = uuid.uuid4().hex[:16]
+        failed_time = time.time()
+        payload_path = os.path.join(self.payload_folder, '{}-{}'.format(token, file_name)) if with_payload else None
+        return {'id': self.get_entry_id(kind, os.path.join(file_path, file_name)), 'token': token, 'kind': kind,
+                'file_path': file_path, 'file_name': file_name, 'file_type': file_type, 'kwargs': kwargs or {},
+                'payload': payload_path, 'count_file': count_file, 'attempts': 1, 'failed_time': failed_time,
+                'next_retry_time': failed_time + self.get_backoff(1), 'error': None, 'dead': False}
+
+    def write_payload(self, entry, write_func):
+        os.makedirs(self.payload_folder, exist_ok=True)
+        temp_path = os.path.join(self.payload_folder, self.TEMP_PAYLOAD_PREFIX + os.path.basename(entry['payload']))
+        try:
+            write_func(temp_path)
+            os.replace(temp_path, entry['payload'])
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @ staticmethod
+    def _remove_payload(entry):
+        if entry.get('payload') is not None and os.path.exists(entry['payload']):
+            os.remove(entry['payload'])
+
+    @ contextmanager
+    def _lock_journal(self):
+        os.makedirs(self.queue_folder, exist_ok=True)
+        with self.lock, open(os.path.join(self.queue_folder, self.JOURNAL_LOCK_FILE_NAME), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @ contextmanager
+    def _lock_replay(self):
+        os.makedirs(self.queue_folder, exist_ok=True)
+        with open(os.path.join(self.queue_folder, self.REPLAY_LOCK_FILE_NAME), 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_journal(self):
+        entries = {}
+        no_records = 0
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    no_records += 1
+                    op = record.pop('op')
+                    if op == 'add':
+                        entries[record['id']] = record
+                    elif record['id'] in entries and entries[record['id']]['token'] == record['token']:
+                        if op == 'done':
+                            del entries[record['id']]
+                        else:
+                            entries[record['id']].update(record)
+        except FileNotFoundError:
+            pass
+        return entries, no_records
+
+    def _append_journal(self, records):
+        with open(self.journal_path, 'ab') as file:
+            if file.tell() > 0:
+                with open(self.journal_path, 'rb') as read_file:
+                    read_file.seek(-1, os.SEEK_END)
+                    if read_file.read(1) != b'\n':
+                        file.write(b'\n')
+            file.write(''.join(json.dumps(record) + '\n' for record in records).encode('utf-8'))
+            file.flush()
+            os.fsync(file.fileno())
+
+    def _compact_journal(self, entries):
+        temp_path = '{}.{}.tmp'.format(self.journal_path, os.getpid())
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            for entry in entries.values():
+                file.write(json.dumps({'op': 'add', **entry}) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.journal_path)
+        if not os.path.isdir(self.payload_folder):
+            return
+        payload_paths = set(entry['payload'] for entry in entries.values() if entry.get('payload') is not None)
+        stale_time = time.time() - self.STALE_PAYLOAD_SECONDS
+        with os.scandir(self.payload_folder) as payload_files:
+            for payload_file in payload_files:
+                if payload_file.path not in payload_paths and payload_file.stat().st_mtime < stale_time:
+                    os.remove(payload_file.path)
+
+    def _commit_records(self, records):
+        with self._lock_journal():
+            self._append_journal(records)
+            entries, no_records = self._read_journal()
+            if no_records > self.COMPACT_MIN_RECORDS and no_records > 2 * len(entries):
+                self._compact_journal(entries)
+
+    def add_entries(self, entries):
+        records = []
+        for entry in entries:
+            try:
+                json.dumps(entry['kwargs'])
+            except (TypeError, ValueError) as e:
+                self.logger.error('Unable to add {} to retry queue. {}'.format(
+                    os.path.join(entry['file_path'], entry['file_name']), e))
+                self._remove_payload(entry)
+                continue
+            records.append({'op': 'add', **entry})
+        if len(records) > 0:
+            self._commit_records(records)
+        return len(records)
+
+    def list_entries(self, kind=None, dead=None):
+        with self._lock_journal():
+            entries, _ = self._read_journal()
+        return [entry for entry in entries.values()
+                if (kind is None or entry['kind'] == kind) and (dead is None or entry['dead'] == dead)]
+
+    def get_due_entries(self, kind, force=False):
+        now = time.time()
+        return [entry for entry in self.list_entries(kind, dead=False) if force or entry['next_retry_time'] <= now]
+
+    @ staticmethod
+    def _run_entry(func, entry):
+        try:
+            return True, func(entry)
+        except Exception as e:
+            return False, e
+
+    def replay(self, kind, func, max_workers=None, force=False):
+        with self._lock_replay() as acquired:
+            if not acquired:
+                return None
+            entries = self.get_due_entries(kind, force)
+            if len(entries) == 0:
+                return []
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                outcomes = list(executor.map(functools.partial(self._run_entry, func), entries))
+            records = []
+            for entry, (success, result) in zip(entries, outcomes):
+                if success:
+                    records.append({'op': 'done', 'id': entry['id'], 'token': entry['token']})
+                    continue
+                entry['attempts'] += 1
+                entry['error'] = str(result)
+                entry['dead'] = entry['attempts'] >= self.max_attempts
+                entry['next_retry_time'] = time.time() + self.get_backoff(entry['attempts'])
+                records.append({'op': 'fail', **{key: entry[key] for key in [
+                    'id', 'token', 'attempts', 'error', 'dead', 'next_retry_time']}})
+            self._commit_records(records)
+            for entry, (success, _) in zip(entries, outcomes):
+                if success:
+                    self._remove_payload(entry)
+        return [(entry, success, result) for entry, (success, result) in zip(entries, outcomes)]
+
+    def clear(self, kind=None, dead=None):
+        entries = self.list_entries(kind, dead)
+        if len(entries) == 0:
+            return 0
+        self._commit_records([{'op': 'done', 'id': entry['id'], 'token': entry['token']} for entry in entries])
+        for entry in entries:
+            self._remove_payload(entry)
+        return len(entries)
@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import fcntl
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+class S3DiskCache(object):
+
+    EVICT_LOCK_NAME = 'evict'
+
+    def __init__(self, fs, cache_folder, max_bytes=10 * 2 ** 30, ttl=60, enabled=False):
+        self.fs = fs
+        self.cache_folder = cache_folder
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.no_bytes = None
+        self.size_lock = threading.Lock()
+        self.stats = {}
+        self.stats_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.stats_lock:
+            self.stats = {'hits': 0, 'misses': 0, 'validations': 0, 'evictions': 0, 'bytes_saved': 0,
+                          'bytes_downloaded': 0}
+
+    def _add_stats(self, **kwargs):
+        with self.stats_lock:
+            for key, value in kwargs.items():
+                self.stats[key] += value
+
+    def get_stats(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        no_requests = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / no_requests if no_requests > 0 else 0
+        return stats
+
+    @ staticmethod
+    def get_cache_key(path):
+        return hashlib.sha1(path.encode('utf-8')).hexdigest()
+
+    def _get_entry_paths(self, cache_key):
+        data_path = os.path.join(self.cache_folder, 'objects', cache_key[:2], cache_key)
+        return data_path, data_path + '.json'
+
+    @ contextmanager
+    def _lock(self, lock_name):
+        lock_folder = os.path.join(self.cache_folder, 'locks')
+        os.makedirs(lock_folder, exist_ok=True)
+        with open(os.path.join(lock_folder, lock_name + '.lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @ staticmethod
+    def _get_temp_path(path):
+        return '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+
+    @ staticmethod
+    def _read_meta(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _write_meta(self, meta_path, meta):
+        temp_path = self._get_temp_path(meta_path)
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(meta, file)
+        os.replace(temp_path, meta_path)
+
+    def _update_size(self, no_bytes):
+        with self.size_lock:
+            if self.no_bytes is not None:
+                self.no_bytes += no_bytes
+
+    def _get_tracked_size(self):
+        with self.size_lock:
+            if self.no_bytes is None:
+                self.no_bytes = self.get_size()
+            return self.no_bytes
+
+    def _remove_entry(self, data_path, meta_path):
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        try:
+            size = os.path.getsize(data_path)
+            os.remove(data_path)
+        except FileNotFoundError:
+            return
+        self._update_size(-size)
+
+    def _validate_entry(self, path, meta, meta_path):
+        if time.time() - meta['validated_time'] <= self.ttl:
+            return True
+        try:
+            remote_info = self.fs.info(path, refresh=True)
+        except FileNotFoundError:
+            return False
+        self._add_stats(validations=1)
+        if remote_info.get('ETag') != meta['etag']:
+            return False
+        meta['validated_time'] = time.time()
+        self._write_meta(meta_path, meta)
+        return True
+
+    def _download(self, path, data_path, meta_path):
+        remote_info = self.fs.info(path, refresh=True)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        temp_path = self._get_temp_path(data_path)
+        try:
+            self.fs.get_file(path, temp_path)
+            os.replace(temp_path, data_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        size = os.path.getsize(data_path)
+        self._write_meta(meta_path, {'path': path, 'etag': remote_info.get('ETag'), 'size': size,
+                                     'validated_time': time.time()})
+        return size
+
+    def open(self, path, mode='rb', **kwargs):
+        cache_key = self.get_cache_key(path)
+        data_path, meta_path = self._get_entry_paths(cache_key)
+        with self._lock(cache_key[:2]):
+            meta = self._read_meta(meta_path)
+            if meta is not None and meta['path'] == path and os.path.isfile(data_path) and self._validate_entry(
+                    path, meta, meta_path):
+                os.utime(data_path)
+                self._add_stats(hits=1, bytes_saved=meta['size'])
+                return open(data_path, mode, **kwargs)
+            self._remove_entry(data_path, meta_path)
+            size = self._download(path, data_path, meta_path)
+            file = open(data_path, mode, **kwargs)
+        self._update_size(size)
+        self._add_stats(misses=1, bytes_downloaded=size)
+        if size > 0 and self._get_tracked_size() > self.max_bytes:
+            self.evict()
+        return file
+
+    def invalidate(self, path):
+        if not os.path.isdir(self.cache_folder):
+            return
+        cache_key = self.get_cache_key(path)
+        with self._lock(cache_key[:2]):
+            self._remove_entry(*self._get_entry_paths(cache_key))
+
+    def _iter_entries(self):
+        objects_folder = os.path.join(self.cache_folder, 'objects')
+        if not os.path.isdir(objects_folder):
+            return
+        with os.scandir(objects_folder) as sub_folders:
+            for sub_folder in sub_folders:
+                with os.scandir(sub_folder.path) as entries:
+                    for entry in entries:
+                        if '.' not in entry.name:
+                            yield entry.name, entry.stat()
+
+    def invalidate_prefix(self, prefix):
+        prefix = prefix.rstrip('/') + '/'
+        for cache_key, _ in list(self._iter_entries()):
+            data_path, meta_path = self._get_entry_paths(cache_key)
+            meta = self._read_meta(meta_path)
+            if meta is not None and meta['path'].startswith(prefix):
+                self.invalidate(meta['path'])
+
+    def clear(self):
+        for cache_key, _ in list(self._iter_entries()):
+            with self._lock(cache_key[:2]):
+                self._remove_entry(*self._get_entry_paths(cache_key))
+
+    def get_size(self):
+        return sum(entry_stat.st_size for _, entry_stat in self._iter_entries())
+
+    def evict(self):
+        with self._lock(self.EVICT_LOCK_NAME):
+            entries = sorted(self._iter_entries(), key=lambda entry: entry[1].st_mtime)
+            total_size = sum(entry_stat.st_size for _, entry_stat in entries)
+            no_evicted = 0
+            for cache_key, entry_stat in entries:
+                if total_size <= self.max_bytes:
+                    break
+                with self._lock(cache_key[:2]):
+                    self._remove_entry(*self._get_entry_paths(cache_key))
+                total_size -= entry_stat.st_size
+                no_evicted += 1
+            with self.size_lock:
+                self.no_bytes = total_size
+        if no_evicted > 0:
+            self._add_stats(evictions=no_evicted)
@@ -4,26 +4,80 @@ sys.path.append(os.environ['SCTYS_PROJECT'] + '/sctys_global_parameters')
 from global_parameters import Path
 sys.path.append(Path.NOTIFIER_PROJECT)
 sys.path.append(Path.UTILITIES_PROJECT)
-from notifiers import get_notifier
-from utilities_functions import convert_datetime_to_timestamp
 from file_io import FileIO
-import pandas as pd
-import pickle
-import json
-import joblib
-import s3fs
-from aws_api_s3 import aws_api
-
-
-s3 = s3fs.S3FileSystem(key=aws_api['id'], secret=aws_api['secret'])
+import time
+import asyncio
+import threading
+from s3_metadata_cache import S3FolderMetadataCache
+from s3_disk_cache import S3DiskCache
+from s3_transfer import S3TransferManager
+from storage_backend import S3Backend
+from format_codec import get_codec
+from io_metrics import io_metrics
+
+
+class LazyS3FileSystem(object):
+
+    def __init__(self):
+        self.fs = None
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def reset_after_fork(self):
+        self.fs = None
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def get_fs(self):
+        if os.getpid() != self.pid:
+            self.reset_after_fork()
+        if self.fs is None:
+            with self.lock:
+                if self.fs is None:
+                    import s3fs
+                    from aws_api_s3 import aws_api
+                    self.fs = s3fs.S3FileSystem(key=aws_api['id'], secret=aws_api['secret'])
+        return self.fs
+
+    def __getattr__(self, name):
+        return getattr(self.get_fs(), name)
+
+
+S3_METADATA_CACHE_TTL = 60
+s3 = LazyS3FileSystem()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=s3.reset_after_fork)
+s3_metadata_cache = S3FolderMetadataCache(s3, S3_METADATA_CACHE_TTL)
+S3_DISK_CACHE_FOLDER = os.path.join(Path.TEMP_FOLDER, 's3_disk_cache')
+S3_DISK_CACHE_MAX_BYTES = 10 * 2 ** 30
+S3_DISK_CACHE_TTL = 60
+s3_disk_cache = S3DiskCache(s3, S3_DISK_CACHE_FOLDER, S3_DISK_CACHE_MAX_BYTES, S3_DISK_CACHE_TTL)
+s3_backend = S3Backend(s3, s3_disk_cache)
 
 
 class S3FileIO(FileIO):
 
+    BACKEND = s3_backend
     EMPTY_FILE_TAG = 'is_empty'
-
-    def __init__(self, project, logger):
-        super().__init__(project, logger)
+    CHECK_EMPTY_FILE_TAG = False
+    TRANSFER_MAX_WORKERS = 16
+    TRANSFER_MAX_PART_WORKERS = 8
+    TRANSFER_CHUNK_SIZE = 64 * 2 ** 20
+    TRANSFER_MAX_RETRIES = 3
+    TRANSFER_RETRY_BACKOFF = 1
+
+    def __init__(self, project, logger, backend=None):
+        super().__init__(project, logger, backend)
+        self.async_s3_clients = {}
+        self.async_s3_clients_lock = threading.Lock()
+        self.transfer_manager = None
+
+    def get_transfer_manager(self):
+        if self.transfer_manager is None:
+            self.transfer_manager = S3TransferManager(
+                s3, self.logger, self.TRANSFER_MAX_WORKERS, self.TRANSFER_CHUNK_SIZE, self.TRANSFER_MAX_PART_WORKERS,
+                self.TRANSFER_MAX_RETRIES, self.TRANSFER_RETRY_BACKOFF)
+        return self.transfer_manager
 
     @ staticmethod
     def list_files_in_folder(path):
@@ -31,15 +85,29 @@ class S3FileIO(FileIO):
         file_list = [file.split('/')[-1] for file in file_list]
         return file_list
 
+    @ classmethod
+    def check_empty_file_tag(cls, path, file_name):
+        return bool(s3.get_tags(os.path.join(path, file_name)).get(cls.EMPTY_FILE_TAG))
+
+    @ classmethod
+    def check_empty_file(cls, path, file_name, file_info):
+        if file_info is None:
+            return cls.check_empty_file_tag(path, file_name)
+        if file_info['size'] > 0:
+            return False
+        if cls.CHECK_EMPTY_FILE_TAG:
+            return cls.check_empty_file_tag(path, file_name)
+        return True
+
     @ classmethod
     def filter_non_empty_files(cls, path, file_list):
-        file_list = [file for file in file_list
-                     if not bool(s3.get_tags(os.path.join(path, file)).get(cls.EMPTY_FILE_TAG))]
+        folder = s3_metadata_cache.get_folder(path) or {}
+        file_list = [file for file in file_list if not cls.check_empty_file(path, file, folder.get(file))]
         return file_list
 
     @ staticmethod
     def check_if_folder_exist(path):
-        return s3.exists(path)
+        return s3_metadata_cache.folder_exists(path)
 
     @ staticmethod
     def create_directory_if_not_exist(path):
@@ -48,153 +116,202 @@ class S3FileIO(FileIO):
 
     @ staticmethod
     def check_if_file_exists(path, file_name):
-        full_file_name = os.path.join(path, file_name)
-        file_exist = s3.exists(full_file_name)
-        return file_exist
+        return s3_metadata_cache.file_exists(path, file_name)
+
+    def update_mtime_index(self, path, file_name):
+        s3_metadata_cache.update_file(path, file_name)
+        s3_disk_cache.invalidate(os.path.join(path, file_name))
+
+    @ staticmethod
+    def set_disk_cache(enabled=True, max_bytes=None, ttl=None):
+        s3_disk_cache.enabled = enabled
+        if max_bytes is not None:
+            s3_disk_cache.max_bytes = max_bytes
+            s3_disk_cache.evict()
+        if ttl is not None:
+            s3_disk_cache.ttl = ttl
+
+    @ staticmethod
+    def get_disk_cache_stats():
+        return s3_disk_cache.get_stats()
+
+    @ staticmethod
+    def get_s3_file_stamp(file_info):
+        return [file_info['size'], file_info.get('ETag') or file_info['LastModified'].timestamp()]
+
+    def get_file_stamp(self, path, file_name):
+        if self.backend is not self.BACKEND:
+            return super().get_file_stamp(path, file_name)
+        file_info = s3_metadata_cache.get_file(path, file_name)
+        if file_info is None:
+            return None
+        return self.get_s3_file_stamp(file_info)
+
+    def get_saved_file_stamp(self, path, file_name, size):
+        if self.backend is not self.BACKEND:
+            return super().get_saved_file_stamp(path, file_name, size)
+        try:
+            file_info = s3.info(os.path.join(path, file_name), refresh=True)
+        except FileNotFoundError:
+            return None
+        return self.get_s3_file_stamp(file_info)
+
+    def get_cache_stamp(self, path, file_name):
+        if self.backend is not self.BACKEND:
+            return super().get_cache_stamp(path, file_name)
+        file_info = s3_metadata_cache.get_file(path, file_name)
+        if file_info is None:
+            return None
+        return [file_info['size'], file_info['LastModified'].timestamp(), file_info.get('ETag')]
+
+    def _link_duplicate_file(self, file_path, file_name, content_hash):
+        return False
 
     def check_modified_time(self, path, file_name=None):
-        if self.check_if_folder_exist(path):
-            file_list = s3.listdir(path)
+        if self.backend is not self.BACKEND:
+            return super().check_modified_time(path, file_name)
+        file_list = s3_metadata_cache.get_folder(path)
+        if file_list is not None:
             if file_name is not None:
-                file_info = [file for file in file_list if file['Key'].split('/')[-1] == file_name]
-                if len(file_info) == 0:
+                file_info = file_list.get(file_name)
+                if file_info is None:
                     self.logger.info('{} not exist. Unable to get the modified time'.format(file_name))
                     return None
                 else:
-                    return file_info[0]['LastModified']
+                    return file_info['LastModified']
             else:
-                return max([file['LastModified'] for file in file_list])
+                return max([file['LastModified'] for file in file_list.values()])
         else:
             self.logger.info('{} not exist. Unable to get the modified time'.format(path))
             return None
 
     def list_modified_files_after_time(self, path, cutoff_date_time):
-        if not self.check_if_folder_exist(path):
+        if self.backend is not self.BACKEND:
+            return super().list_modified_files_after_time(path, cutoff_date_time)
+        file_list = s3_metadata_cache.get_folder(path)
+        if file_list is None:
             return []
+        from utilities_functions import convert_datetime_to_timestamp
         time_stamp = convert_datetime_to_timestamp(cutoff_date_time)
-        file_list = s3.listdir(path)
-        file_list = [file['Key'].split('/')[-1] for file in file_list if file['LastModified'] > time_stamp]
+        file_list = [file_name for file_name, file in file_list.items()
+                     if file['LastModified'].timestamp() > time_stamp]
         return file_list
 
     def list_modified_files_between_time(self, path, cutoff_start_time, cutoff_end_time):
-        if not self.check_if_folder_exist(path):
+        if self.backend is not self.BACKEND:
+            return super().list_modified_files_between_time(path, cutoff_start_time, cutoff_end_time)
+        file_list = s3_metadata_cache.get_folder(path)
+        if file_list is None:
             return []
+        from utilities_functions import convert_datetime_to_timestamp
         start_time_stamp = convert_datetime_to_timestamp(cutoff_start_time)
         end_time_stamp = convert_datetime_to_timestamp(cutoff_end_time)
-        file_list = s3.listdir(path)
-        file_list = [file['Key'].split('/')[-1] for file in file_list
-                     if start_time_stamp <= file['LastModified'] < end_time_stamp]
+        file_list = [file_name for file_name, file in file_list.items()
+                     if start_time_stamp <= file['LastModified'].timestamp() < end_time_stamp]
         return file_list
 
-    def clear_temp_fail_file(self, save):
-        if save:
-            file_key = self.PREFIX_FAIL_SAVE_LIST
-        else:
-            file_key = self.PREFIX_FAIL_LOAD_LIST
-        fail_file_list = self.list_files_in_folder(Path.TEMP_FOLDER)
-        fail_file_list = [os.path.join(Path.TEMP_FOLDER, fail_file) for fail_file in fail_file_list
-                          if file_key in fail_file]
-        [s3.rm(fail_file) for fail_file in fail_file_list]
+    def get_modified_timestamp(self, path, file_name):
+        if self.backend is not self.BACKEND:
+            return super().get_modified_timestamp(path, file_name)
+        file_info = s3_metadata_cache.get_file(path, file_name, refresh=True)
+        if file_info is None:
+            return None
+        return file_info['LastModified'].timestamp()
 
     def save_empty_file(self, path, file_name):
         full_path = os.path.join(path, file_name)
-        self._save_txt_file('', full_path)
-        s3.put_tags(full_path, {self.EMPTY_FILE_TAG, 'true'})
-
-    @staticmethod
-    def _save_binary_file(data, full_path, encoding='utf-8'):
-        with s3.open(full_path, 'wb', encoding=encoding) as file:
-            file.write(data)
-
-    @staticmethod
-    def _save_txt_file(data, full_path, encoding='utf-8'):
-        with s3.open(full_path, 'w', encoding=encoding) as file:
-            file.write(data)
-
-    def _save_html_file(self, data, full_path, encoding='utf-8'):
-        self._save_txt_file(data, full_path, encoding)
-
-    def _save_json_file(self, data, full_path, encoding='utf-8'):
-        if not isinstance(data, str):
-            data = json.dumps(data)
-        self._save_txt_file(data, full_path, encoding)
-
-    @staticmethod
-    def _save_joblib_file(data, full_path, **kwargs):
-        with s3.open(full_path, 'wb') as file:
-            joblib.dump(data, file, **kwargs)
-
-    @staticmethod
-    def _save_pickle_file(data, full_path, pandas=True, **kwargs):
-        with s3.open(full_path, 'wb') as file:
-            if pandas:
-                data.to_pickle(file, **kwargs)
-            else:
-                pickle.dump(data, file, **kwargs)
-
-    @staticmethod
-    def _save_csv_file(data, full_path, **kwargs):
-        with s3.open(full_path, 'w') as file:
-            pd.to_csv(file, **kwargs)
-
-    @staticmethod
-    def _save_parquet_file(data, full_path, **kwargs):
-        with s3.open(full_path, 'wb') as file:
-            data.to_parquet(file, **kwargs)
-
-    @staticmethod
-    def _load_binary_file(full_path, encoding='utf-8'):
-        with s3.open(full_path, 'rb', encoding=encoding) as file:
-            data = file.read()
-        return data
-
-    @staticmethod
-    def _load_txt_file(full_path, encoding='utf-8'):
-        with s3.open(full_path, 'r', encoding=encoding) as file:
-            data = file.read()
-        return data
-
-    def _load_html_file(self, full_path, encoding='utf-8'):
-        data = self._load_txt_file(full_path, encoding)
+        self.backend.save(get_codec('txt'), '', full_path)
+        s3.put_tags(full_path, {self.EMPTY_FILE_TAG: 'true'})
+        s3_metadata_cache.update_file(path, file_name)
+
+    def _get_async_s3_client(self, loop):
+        with self.async_s3_clients_lock:
+            for closed_loop in [client_loop for client_loop in self.async_s3_clients if client_loop.is_closed()]:
+                del self.async_s3_clients[closed_loop]
+            if loop not in self.async_s3_clients:
+                self.async_s3_clients[loop] = {'fs': None, 'session': None, 'closer': None, 'lock': asyncio.Lock()}
+            return self.async_s3_clients[loop]
+
+    def _pop_async_s3_client(self, loop):
+        with self.async_s3_clients_lock:
+            return self.async_s3_clients.pop(loop, None)
+
+    async def _close_async_s3_on_loop_shutdown(self, loop):
+        # The event loop closes all pending async generators on shutdown (e.g. at the end of asyncio.run), which
+        # gives the session of the loop a chance to close before the loop itself is closed.
+        try:
+            yield
+        finally:
+            client = self._pop_async_s3_client(loop)
+            if client is not None and client['session'] is not None:
+                await client['session'].close()
+
+    async def get_async_s3(self):
+        loop = asyncio.get_running_loop()
+        client = self._get_async_s3_client(loop)
+        async with client['lock']:
+            if client['fs'] is None:
+                import s3fs
+                from aws_api_s3 import aws_api
+                async_s3 = s3fs.S3FileSystem(key=aws_api['id'], secret=aws_api['secret'], asynchronous=True,
+                                             skip_instance_cache=True)
+                client['session'] = await async_s3.set_session()
+                client['closer'] = self._close_async_s3_on_loop_shutdown(loop)
+                await client['closer'].asend(None)
+                client['fs'] = async_s3
+        return client['fs']
+
+    async def close_async_s3(self):
+        client = self._pop_async_s3_client(asyncio.get_running_loop())
+        if client is None:
+            return
+        if client['session'] is not None:
+            await client['session'].close()
+        if client['closer'] is not None:
+            await client['closer'].aclose()
+
+    async def _async_save(self, data, file_path, file_name, file_type, **kwargs):
+        if self.backend is not self.BACKEND:
+            return await super()._async_save(data, file_path, file_name, file_type, **kwargs)
+        with io_metrics.measure_async('file_io', 'save', self.backend.NAME, file_type) as measurement:
+            content_digest = self.get_content_digest(data, file_type, **kwargs)
+            if content_digest is not None and await self._run_in_executor(
+                    self.check_content_unchanged, file_path, file_name, content_digest[0]):
+                self.logger.debug('{} unchanged. Skip saving.'.format(os.path.join(file_path, file_name)))
+                measurement.set_status('unchanged')
+                return False
+            start_time = time.perf_counter()
+            content = await self._run_in_executor(get_codec(file_type).dump_to_bytes, data, **kwargs)
+            measurement.add_serialise_time(time.perf_counter() - start_time)
+            start_time = time.perf_counter()
+            await self._async_put_content(os.path.join(file_path, file_name), content)
+            measurement.add_io_time(time.perf_counter() - start_time)
+            measurement.add_bytes(len(content))
+        self._finish_save(file_path, file_name, content_digest)
+        return True
+
+    async def _async_load(self, full_path, file_type, **kwargs):
+        if self.backend is not self.BACKEND:
+            return await super()._async_load(full_path, file_type, **kwargs)
+        with io_metrics.measure_async('file_io', 'load', self.backend.NAME, file_type) as measurement:
+            start_time = time.perf_counter()
+            content = await self._async_get_content(full_path)
+            measurement.add_io_time(time.perf_counter() - start_time)
+            measurement.add_bytes(len(content))
+            start_time = time.perf_counter()
+            data = await self._run_in_executor(get_codec(file_type).load_from_bytes, content, **kwargs)
+            measurement.add_serialise_time(time.perf_counter() - start_time)
         return data
 
-    def _load_json_file(self, full_path, encoding='utf-8'):
-        data = self._load_txt_file(full_path, encoding)
-        data = json.loads(data)
-        return data
+    async def _async_put_content(self, full_path, content):
+        async_s3 = await self.get_async_s3()
+        await async_s3._pipe_file(full_path, content)
 
-    @staticmethod
-    def _load_joblib_file(full_path, **kwargs):
-        with s3.open(full_path, 'rb') as file:
-            data = joblib.load(file, **kwargs)
-        return data
-
-    @staticmethod
-    def _load_pickle_file(full_path, pandas=True, **kwargs):
-        with s3.open(full_path, 'rb') as file:
-            if pandas:
-                data = pd.read_pickle(file, **kwargs)
-            else:
-                data = pickle.load(file, **kwargs)
-        return data
-
-    @staticmethod
-    def _load_csv_file(full_path, **kwargs):
-        with s3.open(full_path, 'w') as file:
-            data = pd.read_csv(file, **kwargs)
-        return data
-
-    @staticmethod
-    def _load_parquet_file(full_path, **kwargs):
-        with s3.open(full_path, 'wb') as file:
-            data = pd.read_parquet(file, **kwargs)
-        return data
-
-    @staticmethod
-    def _load_excel_file(full_path, **kwargs):
-        with s3.open(full_path, 'rb') as file:
-            data = pd.read_excel(file, **kwargs)
-        return data
+    async def _async_get_content(self, full_path):
+        if s3_disk_cache.enabled:
+            return await self._run_in_executor(self.backend.load, get_codec('binary'), full_path)
+        async_s3 = await self.get_async_s3()
+        return await async_s3._cat_file(full_path)
 
     @staticmethod
     def download_file_from_s3(remote_path, local_path, remote_file_name, local_file_name=None):
@@ -204,14 +321,15 @@ class S3FileIO(FileIO):
         local_full_path = os.path.join(local_path, local_file_name)
         if not os.path.exists(local_path):
             os.makedirs(local_path)
-        s3.get_file(remote_full_path, local_full_path)
+        with io_metrics.measure('s3_transfer', 'download', s3_backend.NAME) as measurement:
+            s3.get_file(remote_full_path, local_full_path)
+            measurement.add_bytes(os.path.getsize(local_full_path))
 
     def download_list_of_files_from_s3_folder(self, remote_path, local_path, remote_file_list):
         remote_file_list = self.filter_non_empty_files(remote_path, remote_file_list)
-        if not os.path.exists(local_path):
-            os.makedirs(local_path)
-        for remote_file in remote_file_list:
-            self.download_file_from_s3(remote_path, local_path, remote_file)
+        file_sizes = {file_name: file['size'] for file_name, file in
+                      (s3_metadata_cache.get_folder(remote_path) or {}).items()}
+        return self.get_transfer_manager().download_files(remote_path, local_path, remote_file_list, file_sizes)
 
     @staticmethod
     def upload_file_to_s3(local_path, remote_path, local_file_name, remote_file_name=None):
@@ -219,11 +337,18 @@ class S3FileIO(FileIO):
             remote_file_name = local_file_name
         local_full_path = os.path.join(local_path, local_file_name)
         remote_full_path = os.path.join(remote_path, remote_file_name)
-        s3.put_file(local_full_path, remote_full_path)
+        with io_metrics.measure('s3_transfer', 'upload', s3_backend.NAME) as measurement:
+            s3.put_file(local_full_path, remote_full_path)
+            measurement.add_bytes(os.path.getsize(local_full_path))
+        s3_metadata_cache.update_file(remote_path, remote_file_name)
+        s3_disk_cache.invalidate(remote_full_path)
 
     def upload_list_of_files_to_s3_folder(self, local_path, remote_path, local_file_list):
-        for local_file in local_file_list:
-            self.upload_file_to_s3(local_path, remote_path, local_file)
+        report = self.get_transfer_manager().upload_files(local_path, remote_path, local_file_list)
+        s3_metadata_cache.invalidate(remote_path)
+        for file_name in local_file_list:
+            s3_disk_cache.invalidate(os.path.join(remote_path, file_name))
+        return report
 
     @ staticmethod
     def verify_single_file_downloaded(local_path, local_file_name):
@@ -248,8 +373,7 @@ class S3FileIO(FileIO):
 
     @ staticmethod
     def verify_single_file_uploaded(remote_path, remote_file_name):
-        full_remote_file_name = os.path.join(remote_path, remote_file_name)
-        file_exist = s3.exists(full_remote_file_name)
+        file_exist = s3_metadata_cache.file_exists(remote_path, remote_file_name)
         if file_exist:
             return {'ok': True}
         else:
@@ -257,11 +381,9 @@ class S3FileIO(FileIO):
 
     @ staticmethod
     def verify_list_of_files_uploaded(remote_path, local_file_list):
-        remote_file_list = [os.path.join(remote_path, remote_file) for remote_file in local_file_list]
-        missed_file_list = []
-        for remote_file in remote_file_list:
-            if not s3.exists(remote_file):
-                missed_file_list.append(remote_file)
+        remote_file_list = s3_metadata_cache.get_folder(remote_path, refresh=True) or {}
+        missed_file_list = [os.path.join(remote_path, remote_file) for remote_file in local_file_list
+                            if remote_file not in remote_file_list]
         if len(missed_file_list) == 0:
             return {'ok': True}
         else:
@@ -271,10 +393,37 @@ class S3FileIO(FileIO):
     def remove_file_from_s3(remote_path, remote_file_name):
         remote_full_path = os.path.join(remote_path, remote_file_name)
         s3.rm_file(remote_full_path)
+        s3_metadata_cache.update_file(remote_path, remote_file_name)
+        s3_disk_cache.invalidate(remote_full_path)
 
     @staticmethod
     def remove_all_files_in_s3_folder(remote_path):
         s3.rm(remote_path, recursive=True)
+        s3_metadata_cache.invalidate(remote_path)
+        s3_disk_cache.invalidate_prefix(remote_path)
+
+    def compress_list_of_files_to_s3(self, full_file_list, root_folder, remote_path, compressed_file_name,
+                                     compression_level=None, parallel=False):
+        from file_compression import FileCompress
+        file_compress = FileCompress(self.project, self.logger)
+        compression_format = file_compress.get_compression_format_from_file_name(compressed_file_name)
+        with io_metrics.measure('file_compress', 'compress', self.backend.NAME, compression_format) as measurement:
+            with self.backend.open_for_write(os.path.join(remote_path, compressed_file_name),
+                                             block_size=self.TRANSFER_CHUNK_SIZE) as file:
+                file_compress.compress_list_of_files_to_stream(full_file_list, root_folder, file,
+                                                               compression_format, compression_level, parallel)
+                measurement.add_bytes(file.tell())
+        self.update_mtime_index(remote_path, compressed_file_name)
+
+    def extract_compressed_file_from_s3(self, remote_path, compressed_file_name, root_folder):
+        from file_compression import FileCompress
+        file_compress = FileCompress(self.project, self.logger)
+        compression_format = file_compress.get_compression_format_from_file_name(compressed_file_name)
+        with io_metrics.measure('file_compress', 'decompress', s3_backend.NAME, compression_format) as measurement:
+            with s3.open(os.path.join(remote_path, compressed_file_name), 'rb', block_size=self.TRANSFER_CHUNK_SIZE,
+                         cache_type='none') as file:
+                file_compress.extract_compressed_stream(file, compression_format, root_folder)
+                measurement.add_bytes(file.tell())
 
     def clone_list_of_empty_files_to_s3(self, remote_path, local_file_list):
         for local_file in local_file_list:
@@ -0,0 +1,77 @@
+import time
+import threading
+
+
+class S3FolderMetadataCache(object):
+
+    def __init__(self, fs, ttl=60):
+        self.fs = fs
+        self.ttl = ttl
+        self.folders = {}
+        self.lock = threading.Lock()
+
+    @ staticmethod
+    def normalise_path(path):
+        return path.rstrip('/')
+
+    def _list_folder(self, path):
+        try:
+            file_list = self.fs.ls(path, detail=True, refresh=True)
+        except FileNotFoundError:
+            return None
+        return {file['name'].split('/')[-1]: file for file in file_list if file['type'] == 'file'}
+
+    def get_folder(self, path, refresh=False):
+        path = self.normalise_path(path)
+        with self.lock:
+            cached = self.folders.get(path)
+        if refresh or cached is None or time.time() - cached[0] > self.ttl:
+            cached = (time.time(), self._list_folder(path))
+            with self.lock:
+                self.folders[path] = cached
+        return cached[1]
+
+    def get_file(self, path, file_name, refresh=False):
+        path, file_name = '{}/{}'.format(self.normalise_path(path), file_name).rsplit('/', 1)
+        folder = self.get_folder(path, refresh)
+        if folder is None:
+            return None
+        return folder.get(file_name)
+
+    def folder_exists(self, path, refresh=False):
+        return self.get_folder(path, refresh) is not None
+
+    def file_exists(self, path, file_name, refresh=False):
+        return self.get_file(path, file_name, refresh) is not None
+
+    def update_file(self, path, file_name):
+        path, file_name = '{}/{}'.format(self.normalise_path(path), file_name).rsplit('/', 1)
+        with self.lock:
+            if path not in self.folders:
+                return
+        try:
+            file_info = self.fs.info('{}/{}'.format(path, file_name), refresh=True)
+        except FileNotFoundError:
+            file_info = None
+        with self.lock:
+            cached = self.folders.get(path)
+            if cached is None:
+                return
+            folder = dict(cached[1] or {})
+            if file_info is not None and file_info['type'] == 'file':
+                folder[file_name] = file_info
+            else:
+                folder.pop(file_name, None)
+            if len(folder) > 0:
+                self.folders[path] = (cached[0], folder)
+            else:
+                del self.folders[path]
+
+    def invalidate(self, path=None):
+        with self.lock:
+            if path is None:
+                self.folders = {}
+            else:
+                path = self.normalise_path(path)
+                self.folders = {folder: cached for folder, cached in self.folders.items()
+                                if folder != path and not folder.startswith(path + '/')}
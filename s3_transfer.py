@@ -0,0 +1,170 @@
+import os
+import time
+import errno
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io_metrics import io_metrics
+
+
+class S3TransferManager(object):
+
+    RETRY_ERROR_CODES = {'SlowDown', 'Throttling', 'ThrottlingException', 'RequestLimitExceeded',
+                         'TooManyRequests', 'RequestTimeout', 'RequestTimeTooSkewed', 'InternalError',
+                         'ServiceUnavailable'}
+    RETRY_ERRNOS = {errno.EBUSY, getattr(errno, 'EREMOTEIO', errno.EIO), errno.ETIMEDOUT, errno.ECONNRESET,
+                    errno.ECONNREFUSED, errno.ECONNABORTED, errno.EPIPE}
+
+    def __init__(self, fs, logger, max_workers=16, chunk_size=64 * 2 ** 20, max_part_workers=8, max_retries=3,
+                 retry_backoff=1):
+        self.fs = fs
+        self.logger = logger
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_part_workers = max_part_workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+
+    @ staticmethod
+    def _get_error_chain(error):
+        errors = []
+        while error is not None and error not in errors:
+            errors.append(error)
+            error = error.__cause__ or error.__context__
+        return errors
+
+    @ classmethod
+    def check_retryable_error(cls, error):
+        from aiohttp import ClientConnectionError
+        from botocore.exceptions import ClientError, HTTPClientError, ConnectionError as BotoConnectionError
+        errors = cls._get_error_chain(error)
+        for chained_error in errors:
+            if isinstance(chained_error, ClientError):
+                response = chained_error.response
+                status_code = response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+                return (response.get('Error', {}).get('Code') in cls.RETRY_ERROR_CODES or status_code == 429 or
+                        status_code >= 500)
+        for chained_error in errors:
+            if isinstance(chained_error, (ConnectionError, TimeoutError, HTTPClientError, BotoConnectionError,
+                                          ClientConnectionError)):
+                return True
+            if isinstance(chained_error, OSError) and chained_error.errno in cls.RETRY_ERRNOS:
+                return True
+        return False
+
+    def _retry(self, func, *args, **kwargs):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not self.check_retryable_error(e):
+                    raise
+                wait_time = self.retry_backoff * 2 ** attempt
+                self.logger.warning('Error in transferring with {}. {}. Retry in {}s'.format(
+                    func.__name__, e, wait_time))
+                time.sleep(wait_time)
+
+    def _get_part_ranges(self, size):
+        return [(start, min(start + self.chunk_size, size)) for start in range(0, size, self.chunk_size)]
+
+    async def _async_get_range(self, remote_full_path, start, end, etag):
+        bucket, key, _ = self.fs.split_path(remote_full_path)
+        kwargs = {'IfMatch': etag} if etag is not None else {}
+        response = await self.fs._call_s3('get_object', Bucket=bucket, Key=key,
+                                          Range='bytes={}-{}'.format(start, end - 1), **kwargs)
+        try:
+            return await response['Body'].read()
+        finally:
+            response['Body'].close()
+
+    def _get_range(self, remote_full_path, start, end, etag):
+        from fsspec.asyn import sync
+        return sync(self.fs.loop, self._async_get_range, remote_full_path, start, end, etag)
+
+    def _download_part(self, remote_full_path, local_temp_path, start, end, etag):
+        data = self._retry(self._get_range, remote_full_path, start, end, etag)
+        if len(data) != end - start:
+            raise IOError('Expected {} bytes in range {}-{} of {} but got {}'.format(
+                end - start, start, end, remote_full_path, len(data)))
+        with open(local_temp_path, 'r+b') as file:
+            file.seek(start)
+            file.write(data)
+
+    def _download_file_in_parts(self, remote_full_path, local_full_path):
+        remote_info = self._retry(self.fs.info, remote_full_path, refresh=True)
+        size = remote_info['size']
+        if size <= self.chunk_size:
+            self._retry(self.fs.get_file, remote_full_path, local_full_path)
+            return
+        etag = remote_info.get('ETag')
+        local_temp_path = '{}.part'.format(local_full_path)
+        with open(local_temp_path, 'wb') as file:
+            file.truncate(size)
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_part_workers) as executor:
+                list(executor.map(lambda part: self._download_part(remote_full_path, local_temp_path, *part, etag),
+                                  self._get_part_ranges(size)))
+            if os.path.getsize(local_temp_path) != size:
+                raise IOError('Size of {} does not match {} bytes of {}'.format(
+                    local_temp_path, size, remote_full_path))
+            os.replace(local_temp_path, local_full_path)
+        except Exception:
+            os.remove(local_temp_path)
+            raise
+
+    def download_file(self, remote_full_path, local_full_path, size=None):
+        with io_metrics.measure('s3_transfer', 'download', 's3') as measurement:
+            if size is not None and size > self.chunk_size:
+                self._download_file_in_parts(remote_full_path, local_full_path)
+            else:
+                self._retry(self.fs.get_file, remote_full_path, local_full_path)
+            size = os.path.getsize(local_full_path)
+            measurement.add_bytes(size)
+        return size
+
+    def upload_file(self, local_full_path, remote_full_path):
+        with io_metrics.measure('s3_transfer', 'upload', 's3') as measurement:
+            self._retry(self.fs.put_file, local_full_path, remote_full_path, chunksize=self.chunk_size)
+            size = os.path.getsize(local_full_path)
+            measurement.add_bytes(size)
+        return size
+
+    @ staticmethod
+    def get_throughput_report(operation, no_files, total_bytes, failed_files, time_spent):
+        time_spent = max(time_spent, 1e-9)
+        return {'operation': operation, 'files': no_files, 'bytes': total_bytes, 'failed_files': failed_files,
+                'seconds': time_spent, 'files_per_second': no_files / time_spent,
+                'bytes_per_second': total_bytes / time_spent}
+
+    def _transfer(self, operation, transfer_func, jobs):
+        start_time = time.time()
+        no_files = 0
+        total_bytes = 0
+        failed_files = []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(transfer_func, *job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    total_bytes += future.result()
+                    no_files += 1
+                except Exception as e:
+                    self.logger.error('Error in transferring file {} ({}). {}'.format(futures[future][0], operation, e))
+                    failed_files.append(futures[future][0])
+        report = self.get_throughput_report(operation, no_files, total_bytes, failed_files, time.time() - start_time)
+        self.logger.info('Finished {} of {} files, {} bytes in {:.2f}s ({:.2f} files/s, {:.2f} MB/s). '
+                         '{} failed.'.format(
+            operation, no_files, total_bytes, report['seconds'], report['files_per_second'],
+            report['bytes_per_second'] / 2 ** 20, len(failed_files)))
+        return report
+
+    def download_files(self, remote_path, local_path, file_list, file_sizes=None):
+        if file_sizes is None:
+            file_sizes = {}
+        if not os.path.exists(local_path):
+            os.makedirs(local_path)
+        jobs = [(os.path.join(remote_path, file_name), os.path.join(local_path, file_name),
+                 file_sizes.get(file_name)) for file_name in file_list]
+        return self._transfer('download', self.download_file, jobs)
+
+    def upload_files(self, local_path, remote_path, file_list):
+        jobs = [(os.path.join(local_path, file_name), os.path.join(remote_path, file_name))
+                for file_name in file_list]
+        return self._transfer('upload', self.upload_file, jobs)
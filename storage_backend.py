@@ -0,0 +1,246 @@
+import io
+import os
+import threading
+from contextlib import contextmanager
+from io_metrics import io_metrics
+
+
+ATOMIC_TEMP_PREFIX = '.fileio-tmp-'
+
+
+def is_atomic_temp_file(file_name):
+    return file_name.startswith(ATOMIC_TEMP_PREFIX)
+
+
+class StorageBackend(object):
+
+    NAME = None
+    LOCAL_PATH = False
+
+    def _raise_not_supported(self, operation):
+        raise NotImplementedError('{} backend does not support {}'.format(self.NAME, operation))
+
+    def open(self, full_path, mode='rb', **kwargs):
+        self._raise_not_supported('open')
+
+    @ contextmanager
+    def open_for_write(self, full_path, **kwargs):
+        with self.open(full_path, 'wb', **kwargs) as file:
+            yield file
+
+    def exists(self, full_path):
+        self._raise_not_supported('exists')
+
+    def folder_exists(self, path):
+        self._raise_not_supported('folder_exists')
+
+    def makedirs(self, path):
+        self._raise_not_supported('makedirs')
+
+    def list_files(self, path):
+        self._raise_not_supported('list_files')
+
+    def remove(self, full_path):
+        self._raise_not_supported('remove')
+
+    def get_stamp(self, full_path):
+        self._raise_not_supported('get_stamp')
+
+    def get_arrow_filesystem(self):
+        return None
+
+    def save(self, codec, data, full_path, **kwargs):
+        with self.open_for_write(full_path) as file:
+            codec.dump(data, file, **kwargs)
+            if io_metrics.enabled:
+                io_metrics.add_bytes(file.tell())
+
+    def load(self, codec, full_path, **kwargs):
+        with self.open(full_path, 'rb') as file:
+            data = codec.load(file, **kwargs)
+            if io_metrics.enabled:
+                io_metrics.add_bytes(file.tell())
+            return data
+
+
+class LocalBackend(StorageBackend):
+
+    NAME = 'local'
+    LOCAL_PATH = True
+
+    def open(self, full_path, mode='rb', **kwargs):
+        return open(full_path, mode, **kwargs)
+
+    def exists(self, full_path):
+        return os.path.isfile(full_path)
+
+    def folder_exists(self, path):
+        return os.path.exists(path)
+
+    def makedirs(self, path):
+        os.makedirs(path, exist_ok=True)
+
+    def list_files(self, path):
+        return [file_name for file_name in os.listdir(path) if not is_atomic_temp_file(file_name)]
+
+    def remove(self, full_path):
+        os.remove(full_path)
+
+    def get_stamp(self, full_path):
+        try:
+            file_stat = os.stat(full_path)
+        except FileNotFoundError:
+            return None
+        return [file_stat.st_size, file_stat.st_mtime_ns]
+
+    def save(self, codec, data, full_path, **kwargs):
+        codec.dump_path(data, full_path, **kwargs)
+        if io_metrics.enabled:
+            io_metrics.add_bytes(os.path.getsize(full_path))
+
+    def load(self, codec, full_path, **kwargs):
+        if io_metrics.enabled:
+            io_metrics.add_bytes(os.path.getsize(full_path))
+        return codec.load_path(full_path, **kwargs)
+
+
+class MemoryFile(io.BytesIO):
+
+    def __init__(self, store, full_path):
+        super().__init__()
+        self.store = store
+        self.full_path = full_path
+        self.discarded = False
+
+    def discard(self):
+        self.discarded = True
+
+    def close(self):
+        if not self.closed and not self.discarded:
+            self.store.put(self.full_path, self.getvalue())
+        super().close()
+
+
+class MemoryBackend(StorageBackend):
+
+    NAME = 'memory'
+
+    def __init__(self):
+        self.files = {}
+        self.versions = {}
+        self.version = 0
+        self.lock = threading.Lock()
+
+    def put(self, full_path, content):
+        with self.lock:
+            self.files[full_path] = content
+            self.version += 1
+            self.versions[full_path] = self.version
+
+    def get(self, full_path):
+        with self.lock:
+            if full_path not in self.files:
+                raise FileNotFoundError(full_path)
+            return self.files[full_path]
+
+    def open(self, full_path, mode='rb', **kwargs):
+        if 'r' in mode:
+            return io.BytesIO(self.get(full_path))
+        return MemoryFile(self, full_path)
+
+    @ contextmanager
+    def open_for_write(self, full_path, **kwargs):
+        file = MemoryFile(self, full_path)
+        try:
+            yield file
+        except Exception:
+            file.discard()
+            raise
+        finally:
+            file.close()
+
+    def exists(self, full_path):
+        with self.lock:
+            return full_path in self.files
+
+    def folder_exists(self, path):
+        prefix = path.rstrip('/') + '/'
+        with self.lock:
+            return any(full_path.startswith(prefix) for full_path in self.files)
+
+    def makedirs(self, path):
+        pass
+
+    def remove(self, full_path):
+        with self.lock:
+            self.files.pop(full_path, None)
+            self.versions.pop(full_path, None)
+
+    def list_files(self, path):
+        prefix = path.rstrip('/') + '/'
+        with self.lock:
+            return [full_path[len(prefix):] for full_path in self.files
+                    if full_path.startswith(prefix) and '/' not in full_path[len(prefix):]]
+
+    def get_stamp(self, full_path):
+        with self.lock:
+            if full_path not in self.files:
+                return None
+            return [len(self.files[full_path]), self.versions[full_path]]
+
+    def clear(self):
+        with self.lock:
+            self.files = {}
+            self.versions = {}
+
+
+class S3Backend(StorageBackend):
+
+    NAME = 's3'
+
+    def __init__(self, fs, disk_cache=None):
+        self.fs = fs
+        self.disk_cache = disk_cache
+
+    def open(self, full_path, mode='rb', **kwargs):
+        if mode == 'rb' and self.disk_cache is not None and self.disk_cache.enabled:
+            return self.disk_cache.open(full_path, mode, **kwargs)
+        return self.fs.open(full_path, mode, **kwargs)
+
+    @ contextmanager
+    def open_for_write(self, full_path, **kwargs):
+        file = self.fs.open(full_path, 'wb', **kwargs)
+        try:
+            yield file
+        except Exception:
+            file.discard()
+            file.closed = True
+            raise
+        file.close()
+
+    def exists(self, full_path):
+        return self.fs.isfile(full_path)
+
+    def folder_exists(self, path):
+        return self.fs.exists(path)
+
+    def makedirs(self, path):
+        self.fs.makedirs(path, exist_ok=True)
+
+    def list_files(self, path):
+        return [file.split('/')[-1] for file in self.fs.ls(path, detail=False)]
+
+    def remove(self, full_path):
+        self.fs.rm(full_path)
+
+    def get_stamp(self, full_path):
+        try:
+            file_info = self.fs.info(full_path)
+        except FileNotFoundError:
+            return None
+        last_modified = file_info.get('LastModified')
+        return [file_info['size'], last_modified.timestamp() if last_modified is not None else None,
+                file_info.get('ETag')]
+
+    def get_arrow_filesystem(self):
+        return self.fs.get_fs() if hasattr(self.fs, 'get_fs') else self.fs